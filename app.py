@@ -1,27 +1,144 @@
-from flask import Flask, render_template, redirect, url_for, flash, request, make_response, session
+from flask import Flask, render_template, redirect, url_for, flash, request, make_response, session, jsonify, send_file, abort, g
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.query import Query as FlaskQuery
+from flask_sqlalchemy.session import Session as FlaskSession
+from flask_sqlalchemy.pagination import Pagination
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_wtf import FlaskForm, CSRFProtect
+from flask_wtf.csrf import generate_csrf, CSRFError
 from wtforms import StringField, PasswordField, BooleanField, SubmitField, SelectField, FloatField
+from jinja2 import FileSystemBytecodeCache
 from wtforms.validators import DataRequired, Email, Length, ValidationError, EqualTo
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import csv
+import gzip
 from io import StringIO
 from functools import wraps
-from sqlalchemy import func
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from collections import namedtuple, defaultdict
+from sqlalchemy import func, select, literal, union, union_all, create_engine, event, inspect, tuple_
+from sqlalchemy.orm import sessionmaker, Session, selectinload
+from sqlalchemy.pool import NullPool
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.util import find_tables
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import base64
 import secrets
 import string
 import os
+import sys
+import json
+import threading
+import time
+import calendar
+import contextvars
+import heapq
+import bisect
+import math
+import numpy as np
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-change-this'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///monify.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///monify.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Background jobs (exports and reports run outside the request)
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_POLL_INTERVAL'] = 2            # seconds between queue checks when idle
+app.config['JOB_RETENTION_DAYS'] = 7           # finished jobs and their files are kept this long
+app.config['JOB_STALE_AFTER'] = 300            # running jobs without a heartbeat for this long are requeued
+app.config['JOB_DIR'] = os.path.join(app.instance_path, 'jobs')
+
+# Retention (old expenses move to the archive tables, used/expired reset tokens are purged)
+app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', 730))  # 0 disables archiving
+app.config['RESET_TOKEN_RETENTION_HOURS'] = 24
+
+# Admin reports read from a periodically refreshed copy of the database
+app.config['ANALYTICS_SNAPSHOT_MAX_AGE'] = int(os.environ.get('ANALYTICS_SNAPSHOT_MAX_AGE', 300))  # seconds, 0 reads live
+app.config['ANALYTICS_SNAPSHOT_PATH'] = os.path.join(app.instance_path, 'monify_snapshot.db')
+app.config['ANALYTICS_SNAPSHOT_STALE_LIMIT'] = 5  # reports read live once the snapshot is this many max ages old
+
+# Budget alerts fire when a category's monthly spend crosses these percentages of its limit
+app.config['BUDGET_ALERT_THRESHOLDS'] = (80, 100)
+
+# Tenant sharding: users' data is split over SHARD_COUNT SQLite files by user id so writes
+# from different users don't wait on one lock. Accounts and admins stay in monify.db.
+# Changing the shard count of an existing install needs the data moved by hand.
+app.config['SHARD_COUNT'] = int(os.environ.get('SHARD_COUNT', 0))  # 0 keeps everything in monify.db
+app.config['SHARD_DIR'] = os.path.join(app.instance_path, 'shards')
+app.config['SHARD_FANOUT_WORKERS'] = 8        # threads used when admin reports query every shard
+if app.config['SHARD_COUNT']:
+    os.makedirs(app.config['SHARD_DIR'], exist_ok=True)
+    app.config['SQLALCHEMY_BINDS'] = {
+        f'shard_{n}': 'sqlite:///' + os.path.join(app.config['SHARD_DIR'], f'shard_{n}.db')
+        for n in range(app.config['SHARD_COUNT'])
+    }
+
+# Development aid: count SQL per request and flag relationships lazy-loaded over and over (N+1)
+app.config['LAZY_LOAD_THRESHOLD'] = int(os.environ.get('LAZY_LOAD_THRESHOLD', 0))  # 0 disables tracking
+app.config['LAZY_LOAD_RAISE'] = os.environ.get('LAZY_LOAD_RAISE') == '1'         # raise instead of logging
+
+# Anonymous landing and auth pages come from a rendered-page cache; templates are compiled once
+app.config['PAGE_CACHE_TTL'] = int(os.environ.get('PAGE_CACHE_TTL', 300))  # seconds, 0 disables
+app.config['JINJA_CACHE_DIR'] = os.environ.get('JINJA_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache'))  # empty disables
+
+class LazyBytecodeCache(FileSystemBytecodeCache):
+    """Creates the cache directory on the first compiled template instead of at import"""
+    def dump_bytecode(self, bucket):
+        os.makedirs(self.directory, exist_ok=True)
+        super().dump_bytecode(bucket)
+
+if app.config['JINJA_CACHE_DIR']:
+    app.jinja_env.bytecode_cache = LazyBytecodeCache(app.config['JINJA_CACHE_DIR'])
+
+# Tenant sharding
+TENANT_TABLES = {'category', 'expense', 'budget', 'recurring_expense', 'archived_expense',
+                 'archive_rollup', 'sync_change', 'category_month_total', 'budget_alert', 'amount_sketch',
+                 'category_amount_sketch'}
+_active_shard = contextvars.ContextVar('active_shard', default=None)
+
+def shard_for(user_id):
+    """Shard number holding a user's data, or None when sharding is off"""
+    count = app.config['SHARD_COUNT']
+    return user_id % count if count else None
+
+def all_shards():
+    return list(range(app.config['SHARD_COUNT'])) or [None]
+
+@contextmanager
+def use_shard(shard):
+    """Route tenant queries made inside the block to the given shard"""
+    token = _active_shard.set(shard)
+    try:
+        yield
+    finally:
+        _active_shard.reset(token)
+
+class ShardRoutingSession(FlaskSession):
+    """Sends statements on tenant tables to the active shard; everything else uses the default bind.
+
+    A session made for one shard carries it in session.info['shard'] instead of
+    relying on the active shard.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and app.config['SHARD_COUNT']:
+            tables = [inspect(mapper).local_table] if mapper is not None else []
+            if clause is not None:
+                tables.extend(find_tables(clause, include_crud=True))
+            if any(getattr(table, 'name', None) in TENANT_TABLES for table in tables):
+                shard = self.info.get('shard', _active_shard.get())
+                if shard is None:
+                    raise RuntimeError('Tenant data queried without a shard; wrap the call in use_shard()')
+                return self._db.engines[f'shard_{shard}']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
 # Initialize extensions
 csrf = CSRFProtect(app)
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': ShardRoutingSession})
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
@@ -34,6 +151,9 @@ class User(db.Model, UserMixin):
     email = db.Column(db.String(150), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    categories_version = db.Column(db.Integer, default=0)  # bumped whenever the user's categories change
+    data_version = db.Column(db.Integer, default=0)        # bumped on every expense, budget or recurring change
+    pending_alerts = db.Column(db.Integer, default=0)      # budget alerts not yet shown to the user
     expenses = db.relationship('Expense', backref='user', lazy=True, cascade='all, delete-orphan')
     categories = db.relationship('Category', backref='user', lazy=True, cascade='all, delete-orphan')
     budgets = db.relationship('Budget', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -74,6 +194,7 @@ class Category(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     icon = db.Column(db.String(50), default="fas fa-tag")  # NEW
     color = db.Column(db.String(7), default="#667eea")     # NEW
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     expenses = db.relationship('Expense', backref='category', lazy=True)
 
     def __repr__(self):
@@ -87,6 +208,12 @@ class Expense(db.Model):
     date = db.Column(db.Date, nullable=False, default=datetime.today)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    is_archived = False
+
+    # Archived rows keep their expense id, so ids must never be handed out twice
+    __table_args__ = {'sqlite_autoincrement': True}
 
     def __repr__(self):
         return f'<Expense {self.description}: {self.amount}>'
@@ -97,12 +224,139 @@ class Budget(db.Model):
     monthly_limit = db.Column(db.Float, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     category = db.relationship('Category', backref='budget', uselist=False)
 
     def __repr__(self):
         return f'<Budget {self.category.name}: {self.monthly_limit}>'
 
+class ArchivedExpense(db.Model):
+    """Cold copy of an expense older than ARCHIVE_AFTER_DAYS; keeps the original id"""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    category = db.relationship('Category')
+    user = db.relationship('User', backref=db.backref('archived_expenses', lazy='dynamic', cascade='all, delete-orphan'))
+
+    is_archived = True
+
+    def __repr__(self):
+        return f'<ArchivedExpense {self.description}: {self.amount}>'
+
+class ArchiveRollup(db.Model):
+    """Monthly totals of archived expenses so summaries never scan the archive"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    total = db.Column(db.Float, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    user = db.relationship('User', backref=db.backref('archive_rollups', lazy='dynamic', cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<ArchiveRollup {self.month}: {self.total}>'
+
+class CategoryMonthTotal(db.Model):
+    """Running spend per category and month, adjusted on every expense write"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    category_id = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    total = db.Column(db.Float, nullable=False, default=0)
+
+    user = db.relationship('User', backref=db.backref('category_month_totals', lazy='dynamic', cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.UniqueConstraint('category_id', 'month', name='uq_category_month_total'),
+    )
+
+class AmountSketch(db.Model):
+    """Quantile sketch of expense amounts per category and month (see QuantileSketch)"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    category_id = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)
+    buckets = db.Column(db.Text, nullable=False)  # JSON bucket counts
+
+    user = db.relationship('User', backref=db.backref('amount_sketches', lazy='dynamic', cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.UniqueConstraint('category_id', 'month', name='uq_amount_sketch_month'),
+        db.Index('ix_amount_sketch_month', 'month'),
+    )
+
+class CategoryAmountSketch(db.Model):
+    """Every user's AmountSketch merged per category name and month, so reports read one row
+    per name and month instead of one per user"""
+    id = db.Column(db.Integer, primary_key=True)
+    category_name = db.Column(db.String(100), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)
+    buckets = db.Column(db.Text, nullable=False)  # JSON bucket counts
+
+    __table_args__ = (
+        db.UniqueConstraint('category_name', 'month', name='uq_category_amount_sketch_month'),
+        db.Index('ix_category_amount_sketch_month', 'month'),
+    )
+
+class BudgetAlert(db.Model):
+    """Highest spending threshold a budget has crossed in a month; one row per budget and month"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    category_id = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    threshold = db.Column(db.Integer, nullable=False)  # percent of the monthly limit
+    spent = db.Column(db.Float, nullable=False)
+    monthly_limit = db.Column(db.Float, nullable=False)
+    seen = db.Column(db.Boolean, default=False, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    user = db.relationship('User', backref=db.backref('budget_alerts', lazy='dynamic', cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.UniqueConstraint('category_id', 'month', name='uq_budget_alert_month'),
+        db.Index('ix_budget_alert_user_seen', 'user_id', 'seen'),
+    )
+
+    def __repr__(self):
+        return f'<BudgetAlert {self.category_id} {self.month} {self.threshold}%>'
+
+class SyncChange(db.Model):
+    """Latest change to a synced row; deleted rows stay here as tombstones.
+
+    Only the newest entry per object is kept, so the log stays as large as the data.
+    AUTOINCREMENT keeps a rewritten entry from getting its old id back, and SQLite
+    serialises writers, so ids become visible in increasing order and can be used
+    directly as sync cursors.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    object_id = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, default=False, nullable=False)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    user = db.relationship('User', backref=db.backref('sync_changes', lazy='dynamic', cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.Index('ix_sync_change_user_seq', 'user_id', 'id'),
+        db.Index('ix_sync_change_object', 'kind', 'object_id'),
+        {'sqlite_autoincrement': True},
+    )
+
+    def __repr__(self):
+        return f'<SyncChange {self.id} {self.kind}:{self.object_id}>'
+
 class PasswordResetToken(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -123,7 +377,56 @@ class PasswordResetToken(db.Model):
     def __repr__(self):
         return f'<PasswordResetToken {self.token}>'
 
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    progress = db.Column(db.Integer, default=0)
+    result_path = db.Column(db.String(300))
+    result_name = db.Column(db.String(200))
+    error = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    user = db.relationship('User', backref=db.backref('jobs', cascade='all, delete-orphan'))
+
+    def get_params(self):
+        return json.loads(self.params or '{}')
+
+    def is_finished(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress or 0,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'download_url': url_for('job_download', job_id=self.id) if self.status == 'done' else None
+        }
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind}: {self.status}>'
+
+class MaintenanceLease(db.Model):
+    """Named lease so periodic maintenance runs in one process at a time"""
+    name = db.Column(db.String(50), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
 # Forms
+def finite_number(form, field):
+    # FloatField accepts "inf" and "nan", which no amount or limit can be
+    if field.data is not None and not math.isfinite(field.data):
+        raise ValidationError('Please enter a valid number.')
+
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
     password = PasswordField('Password', validators=[DataRequired()])
@@ -154,7 +457,7 @@ class RegisterForm(FlaskForm):
 
 class ExpenseForm(FlaskForm):
     description = StringField('Description', validators=[DataRequired()])
-    amount = FloatField('Amount', validators=[DataRequired()])
+    amount = FloatField('Amount', validators=[DataRequired(), finite_number])
     date = StringField('Date', default=datetime.today().strftime('%Y-%m-%d'), validators=[DataRequired()])
     category = SelectField('Category', coerce=int, validators=[DataRequired()])
     submit = SubmitField('Save Expense')
@@ -193,7 +496,7 @@ class CategoryForm(FlaskForm):
 
 class BudgetForm(FlaskForm):
     category = SelectField('Category', coerce=int, validators=[DataRequired()])
-    monthly_limit = FloatField('Monthly Budget Limit (₹)', validators=[DataRequired()])
+    monthly_limit = FloatField('Monthly Budget Limit (₹)', validators=[DataRequired(), finite_number])
     submit = SubmitField('Set Budget')
 
 class ForgotPasswordForm(FlaskForm):
@@ -235,39 +538,83 @@ class RecurringExpense(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     frequency = db.Column(db.String(20), nullable=False, default='monthly')
     next_due_date = db.Column(db.Date, nullable=False)
+    anchor_date = db.Column(db.Date)
     auto_add = db.Column(db.Boolean, default=False)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     last_processed = db.Column(db.Date)
     
     category = db.relationship('Category', backref='recurring_expenses')
     user = db.relationship('User', backref='recurring_expenses')
 
+    @property
+    def schedule_anchor(self):
+        """First due date of the schedule; later dates keep its day of month where possible"""
+        return self.anchor_date or self.next_due_date
+
     def get_next_due_date(self):
         """Calculate next due date based on frequency"""
-        if self.frequency == 'daily':
-            return self.next_due_date + timedelta(days=1)
-        elif self.frequency == 'weekly':
-            return self.next_due_date + timedelta(weeks=1)
-        elif self.frequency == 'monthly':
-            next_month = self.next_due_date.month + 1
-            next_year = self.next_due_date.year
-            if next_month > 12:
-                next_month = 1
-                next_year += 1
-            try:
-                return datetime(next_year, next_month, self.next_due_date.day).date()
-            except ValueError:
-                return datetime(next_year, next_month, 28).date()
-        elif self.frequency == 'yearly':
-            return datetime(self.next_due_date.year + 1, self.next_due_date.month, self.next_due_date.day).date()
-        return self.next_due_date
+        if self.frequency not in RECURRENCE_DAYS and self.frequency not in RECURRENCE_MONTHS:
+            return self.next_due_date
+        anchor = self.schedule_anchor
+        n = first_occurrence_index(anchor, self.frequency, self.next_due_date + timedelta(days=1))
+        return nth_occurrence(anchor, self.frequency, n)
+
+    def advance(self):
+        """Move next_due_date to the following occurrence"""
+        self.anchor_date = self.schedule_anchor
+        self.next_due_date = self.get_next_due_date()
+
+    def due_dates_until(self, end):
+        """Every due date from next_due_date up to and including end"""
+        return recurrence_dates(self.schedule_anchor, self.frequency, self.next_due_date, end)
+
+RECURRENCE_DAYS = {'daily': 1, 'weekly': 7}
+RECURRENCE_MONTHS = {'monthly': 1, 'yearly': 12}
+
+def nth_occurrence(anchor, frequency, n):
+    """The n-th due date after anchor. Monthly and yearly dates fall back to the last day of
+    shorter months (Jan 31 -> Feb 28 -> Mar 31, Feb 29 -> Feb 28) without drifting."""
+    if frequency in RECURRENCE_DAYS:
+        return anchor + timedelta(days=n * RECURRENCE_DAYS[frequency])
+    year, month = divmod(anchor.month - 1 + n * RECURRENCE_MONTHS[frequency], 12)
+    year += anchor.year
+    return datetime(year, month + 1, min(anchor.day, calendar.monthrange(year, month + 1)[1])).date()
+
+def first_occurrence_index(anchor, frequency, start):
+    """Smallest n >= 0 whose occurrence falls on or after start"""
+    if start <= anchor:
+        return 0
+    if frequency in RECURRENCE_DAYS:
+        return -(-(start - anchor).days // RECURRENCE_DAYS[frequency])
+    months = (start.year - anchor.year) * 12 + start.month - anchor.month
+    n = months // RECURRENCE_MONTHS[frequency]
+    return n if nth_occurrence(anchor, frequency, n) >= start else n + 1
+
+def recurrence_dates(anchor, frequency, start, end):
+    """Due dates of a schedule between start and end (inclusive). The first and last
+    occurrence are located arithmetically, so each date is computed once, never stepped to."""
+    if frequency not in RECURRENCE_DAYS and frequency not in RECURRENCE_MONTHS:
+        return [anchor] if start <= anchor <= end else []
+    first = first_occurrence_index(anchor, frequency, start)
+    stop = first_occurrence_index(anchor, frequency, end + timedelta(days=1))
+    return [nth_occurrence(anchor, frequency, n) for n in range(first, stop)]
+
+def recurrence_span(anchor, frequency, start, end):
+    """(first due date, number of due dates) between start and end (inclusive), counted
+    without listing the dates; (None, 0) when there are none"""
+    if frequency not in RECURRENCE_DAYS and frequency not in RECURRENCE_MONTHS:
+        return (anchor, 1) if start <= anchor <= end else (None, 0)
+    first = first_occurrence_index(anchor, frequency, start)
+    count = first_occurrence_index(anchor, frequency, end + timedelta(days=1)) - first
+    return (nth_occurrence(anchor, frequency, first), count) if count > 0 else (None, 0)
 
 
 class RecurringExpenseForm(FlaskForm):
     description = StringField('Description', validators=[DataRequired()], 
                             render_kw={"placeholder": "e.g., Netflix Subscription, Rent, Insurance"})
-    amount = FloatField('Amount (₹)', validators=[DataRequired()], 
+    amount = FloatField('Amount (₹)', validators=[DataRequired(), finite_number], 
                        render_kw={"placeholder": "0.00"})
     category = SelectField('Category', coerce=int, validators=[DataRequired()])
     frequency = SelectField('Frequency', choices=[
@@ -303,11 +650,1467 @@ def super_admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Background job runner
+class JobCancelled(Exception):
+    pass
+
+JOB_HANDLERS = {}
+_job_workers = []
+_job_workers_lock = threading.Lock()
+
+def job_handler(kind):
+    """Register a function that runs jobs of the given kind"""
+    def decorator(f):
+        JOB_HANDLERS[kind] = f
+        return f
+    return decorator
+
+def enqueue_job(user_id, kind, result_path=None, **params):
+    # result_path may hold an uploaded input file so it is cleaned up with the job
+    job = Job(user_id=user_id, kind=kind, params=json.dumps(params), result_path=result_path)
+    db.session.add(job)
+    db.session.commit()
+    start_job_workers()
+    return job
+
+def update_job_progress(job, progress):
+    """Record progress and a heartbeat, raising JobCancelled if the user cancelled the job"""
+    db.session.refresh(job)
+    if job.cancel_requested:
+        raise JobCancelled()
+    job.progress = min(int(progress), 100)
+    job.heartbeat_at = datetime.utcnow()
+    db.session.commit()
+
+def claim_next_job():
+    """Atomically move the oldest queued job to running; safe across processes"""
+    while True:
+        job = Job.query.filter_by(status='queued').order_by(Job.id).first()
+        if not job:
+            return None
+        now = datetime.utcnow()
+        claimed = Job.query.filter_by(id=job.id, status='queued').update(
+            {Job.status: 'running', Job.started_at: now, Job.heartbeat_at: now},
+            synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            db.session.refresh(job)
+            return job
+
+def job_heartbeat(job_id, stop):
+    """Refresh a running job's heartbeat on a timer from a separate session, so a long step
+    inside one transaction (a restore) is not mistaken for a dead worker and run twice"""
+    while not stop.wait(app.config['JOB_STALE_AFTER'] / 5):
+        try:
+            with app.app_context():
+                Job.query.filter_by(id=job_id, status='running').update(
+                    {Job.heartbeat_at: datetime.utcnow()}, synchronize_session=False)
+                db.session.commit()
+        except Exception:
+            app.logger.exception('Heartbeat for job %s failed', job_id)
+
+def run_next_job():
+    """Run one queued job to completion. Returns False when the queue is empty."""
+    job = claim_next_job()
+    if not job:
+        return False
+    
+    stop_heartbeat = threading.Event()
+    threading.Thread(target=job_heartbeat, args=(job.id, stop_heartbeat),
+                     name=f'monify-job-{job.id}-heartbeat', daemon=True).start()
+    handler = JOB_HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise ValueError(f'Unknown job type "{job.kind}"')
+        os.makedirs(app.config['JOB_DIR'], exist_ok=True)
+        with use_shard(shard_for(job.user_id)):
+            handler(job, **job.get_params())
+        job.status = 'done'
+        job.progress = 100
+    except JobCancelled:
+        db.session.rollback()
+        job.status = 'cancelled'
+    except Exception as e:
+        db.session.rollback()
+        job.status = 'failed'
+        job.error = str(e)
+        app.logger.exception('Job %s failed', job.id)
+    finally:
+        stop_heartbeat.set()
+    
+    if job.status != 'done':
+        remove_job_file(job)
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return True
+
+def remove_job_file(job):
+    if job.result_path and os.path.exists(job.result_path):
+        os.remove(job.result_path)
+    job.result_path = None
+
+def purge_old_jobs():
+    """Drop finished jobs past the retention window and requeue jobs whose worker died"""
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=app.config['JOB_RETENTION_DAYS'])
+    expired = Job.query.filter(
+        Job.status.in_(['done', 'failed', 'cancelled']),
+        Job.finished_at < cutoff
+    ).all()
+    for job in expired:
+        remove_job_file(job)
+        db.session.delete(job)
+    
+    stale = now - timedelta(seconds=app.config['JOB_STALE_AFTER'])
+    Job.query.filter(Job.status == 'running', Job.heartbeat_at < stale).update(
+        {Job.status: 'queued', Job.progress: 0}, synchronize_session=False)
+    db.session.commit()
+
+def claim_lease(name, seconds):
+    """Take the named lease for the given number of seconds unless another process holds it"""
+    now = datetime.utcnow()
+    db.session.execute(sqlite_insert(MaintenanceLease.__table__).values(
+        name=name, expires_at=now - timedelta(seconds=1)).on_conflict_do_nothing())
+    claimed = MaintenanceLease.query.filter(MaintenanceLease.name == name, MaintenanceLease.expires_at < now).update(
+        {MaintenanceLease.expires_at: now + timedelta(seconds=seconds)}, synchronize_session=False)
+    db.session.commit()
+    return bool(claimed)
+
+def job_worker_loop(run_maintenance=False):
+    last_purge = 0
+    while True:
+        try:
+            with app.app_context():
+                if run_maintenance and time.time() - last_purge > 3600:
+                    purge_old_jobs()
+                    run_retention()
+                    last_purge = time.time()
+                while run_next_job():
+                    pass
+        except Exception:
+            app.logger.exception('Job worker error')
+        time.sleep(app.config['JOB_POLL_INTERVAL'])
+
+def start_job_workers():
+    """Start the worker pool once per process; disabled while testing so jobs run on demand"""
+    if app.config.get('TESTING') or app.config['JOB_WORKERS'] <= 0:
+        return
+    with _job_workers_lock:
+        if _job_workers:
+            return
+        for i in range(app.config['JOB_WORKERS']):
+            worker = threading.Thread(target=job_worker_loop, args=(i == 0,), name=f'monify-job-{i}', daemon=True)
+            worker.start()
+            _job_workers.append(worker)
+
+# Retention
+def archive_old_expenses(cutoff=None):
+    """Move expenses dated before the cutoff into the archive and roll up their monthly totals.
+
+    The batch is tagged with its archived_at timestamp, so the rollup and the delete only
+    touch rows copied by this run, all inside one transaction.
+    """
+    if cutoff is None:
+        if app.config['ARCHIVE_AFTER_DAYS'] <= 0:
+            return 0
+        cutoff = datetime.now().date() - timedelta(days=app.config['ARCHIVE_AFTER_DAYS'])
+    
+    batch = datetime.utcnow()
+    columns = ['id', 'description', 'amount', 'date', 'user_id', 'category_id', 'archived_at']
+    db.session.execute(ArchivedExpense.__table__.insert().from_select(columns, select(
+        Expense.id, Expense.description, Expense.amount, Expense.date,
+        Expense.user_id, Expense.category_id, literal(batch)
+    ).where(Expense.date < cutoff)))
+    
+    rollups = db.session.query(
+        ArchivedExpense.user_id,
+        ArchivedExpense.category_id,
+        func.strftime('%Y-%m', ArchivedExpense.date),
+        func.sum(ArchivedExpense.amount),
+        func.count(ArchivedExpense.id)
+    ).filter(ArchivedExpense.archived_at == batch).group_by(
+        ArchivedExpense.user_id, ArchivedExpense.category_id, func.strftime('%Y-%m', ArchivedExpense.date)
+    ).all()
+    db.session.bulk_insert_mappings(ArchiveRollup, [
+        {'user_id': user_id, 'category_id': category_id, 'month': month, 'total': total, 'count': count}
+        for user_id, category_id, month, total, count in rollups
+    ])
+    
+    archived = Expense.query.filter(Expense.id.in_(
+        select(ArchivedExpense.id).where(ArchivedExpense.archived_at == batch)
+    )).delete(synchronize_session=False)
+    db.session.commit()
+    return archived
+
+def purge_reset_tokens():
+    """Delete reset tokens that were used or expired more than RESET_TOKEN_RETENTION_HOURS ago"""
+    cutoff = datetime.utcnow() - timedelta(hours=app.config['RESET_TOKEN_RETENTION_HOURS'])
+    purged = PasswordResetToken.query.filter(
+        db.or_(PasswordResetToken.used == True, PasswordResetToken.expires_at < cutoff)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return purged
+
+def run_retention():
+    archived = 0
+    for shard in all_shards():
+        with use_shard(shard):
+            archived += archive_old_expenses()
+            backfill_amount_sketches()
+    return archived, purge_reset_tokens()
+
+def archived_category_totals(user_id):
+    """Archived totals and counts per category id, read from the rollup table"""
+    rows = db.session.query(
+        ArchiveRollup.category_id,
+        func.sum(ArchiveRollup.total),
+        func.sum(ArchiveRollup.count)
+    ).filter(ArchiveRollup.user_id == user_id).group_by(ArchiveRollup.category_id).all()
+    return {category_id: (total or 0, count or 0) for category_id, total, count in rows}
+
+def expense_history_rows(user_id, include_archived=False):
+    """(date, description, amount, category name) rows, newest first, optionally including the archive"""
+    def rows_for(model):
+        return select(
+            model.date, model.description, model.amount, Category.name.label('category_name'), model.id
+        ).join(Category, model.category_id == Category.id).where(model.user_id == user_id)
+    
+    query = rows_for(Expense)
+    if include_archived:
+        query = union_all(query, rows_for(ArchivedExpense))
+    query = query.subquery()
+    return db.session.execute(
+        select(query.c.date, query.c.description, query.c.amount, query.c.category_name)
+        .order_by(query.c.date.desc(), query.c.id.desc())
+        .execution_options(yield_per=1000)
+    )
+
+# Per-user category cache
+CachedCategory = namedtuple('CachedCategory', ['id', 'name', 'icon', 'color'])
+_category_cache = {}
+CATEGORY_CACHE_MAX_USERS = 10000
+
+def cache_user_entry(cache, user_id, entry, max_users):
+    """Store a per-user cache entry, evicting the least recently stored users past max_users"""
+    cache.pop(user_id, None)
+    cache[user_id] = entry
+    while len(cache) > max_users:
+        del cache[next(iter(cache))]
+    return entry
+
+def get_user_categories(user):
+    """The user's categories as (id, name, icon, color) tuples.
+
+    Entries are keyed by User.categories_version, which comes with the already-loaded
+    current_user, so a hit costs no query and a change made by another worker
+    process is picked up on the next request.
+    """
+    version = user.categories_version or 0
+    cached = _category_cache.get(user.id)
+    if cached and cached[0] == version:
+        return cached[1]
+    
+    rows = db.session.query(
+        Category.id, Category.name, Category.icon, Category.color
+    ).filter_by(user_id=user.id).order_by(Category.id).all()
+    categories = tuple(CachedCategory(*row) for row in rows)
+    if len(_category_cache) >= CATEGORY_CACHE_MAX_USERS:
+        _category_cache.clear()
+    _category_cache[user.id] = (version, categories)
+    return categories
+
+def invalidate_user_categories(user_id):
+    """Bump the user's categories version; call before committing a category change"""
+    User.query.filter_by(id=user_id).update(
+        {User.categories_version: func.coalesce(User.categories_version, 0) + 1},
+        synchronize_session=False)
+    _category_cache.pop(user_id, None)
+
+def category_choices(user):
+    return [(c.id, c.name) for c in get_user_categories(user)]
+
+# Budget forecasting
+_forecast_cache = {}
+FORECAST_CACHE_MAX_USERS = 10000
+
+def bump_data_version(user):
+    """Bump the user's data version in the current transaction; returns the version it replaces"""
+    previous = user.data_version or 0
+    user.data_version = func.coalesce(User.data_version, 0) + 1
+    return previous
+
+def is_recurring_expense(description):
+    return description.startswith('[Recurring]') or description.startswith('[Auto]')
+
+def project_forecast(forecast, days_elapsed, days_in_month):
+    """Month-end projection: spend so far, plus the day-of-month burn rate of non-recurring
+    spend over the remaining days, plus recurring expenses still due this month"""
+    forecast['daily_rate'] = (forecast['spent'] - forecast['recurring_spent']) / days_elapsed
+    forecast['projected'] = (forecast['spent'] + forecast['daily_rate'] * (days_in_month - days_elapsed)
+                             + forecast['recurring_due'])
+    limit = forecast['limit']
+    forecast['projected_percentage'] = forecast['projected'] / limit * 100 if limit else 0
+    return forecast
+
+def compute_forecasts(user_ids=None, today=None, session=None):
+    """Month-end forecasts for many users at once, cached per user.
+
+    Spending is laid out as a (user x category x day) matrix so the burn rates and
+    projections for every user come out of a few NumPy operations.
+    """
+    today = today or datetime.now().date()
+    session = session or db.session
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    month_start = today.replace(day=1)
+    month_end = today.replace(day=days_in_month)
+    
+    def for_users(query, column):
+        return query if user_ids is None else query.filter(column.in_(user_ids))
+    
+    users = for_users(session.query(User.id, User.data_version), User.id)
+    if session.info.get('shard') is not None:
+        # A shard session only sees its own users' data
+        users = users.filter(User.id % app.config['SHARD_COUNT'] == session.info['shard'])
+    users = users.order_by(User.id).all()
+    user_index = {user_id: i for i, (user_id, _) in enumerate(users)}
+    
+    # Each user's categories get consecutive columns along the category axis
+    slots = {}
+    columns = defaultdict(int)
+    category_rows = for_users(session.query(Category.id, Category.user_id), Category.user_id).order_by(
+        Category.user_id, Category.id).all()
+    for category_id, user_id in category_rows:
+        slots[category_id] = (user_index[user_id], columns[user_id])
+        columns[user_id] += 1
+    
+    shape = (len(users), max(columns.values(), default=0))
+    spend = np.zeros(shape + (days_in_month,))
+    recurring_spent = np.zeros(shape)
+    recurring_due = np.zeros(shape)
+    limits = np.zeros(shape)
+    
+    recurring_flag = db.or_(Expense.description.like('[Recurring]%'), Expense.description.like('[Auto]%'))
+    rows = for_users(session.query(
+        Expense.category_id,
+        func.strftime('%d', Expense.date),
+        recurring_flag,
+        func.sum(Expense.amount)
+    ), Expense.user_id).filter(
+        Expense.date >= month_start,
+        Expense.date <= month_end
+    ).group_by(Expense.category_id, func.strftime('%d', Expense.date), recurring_flag).all()
+    rows = [row for row in rows if row[0] in slots]
+    if rows:
+        u, k = np.array([slots[row[0]] for row in rows]).T
+        day = np.array([int(row[1]) - 1 for row in rows])
+        is_recurring = np.array([bool(row[2]) for row in rows])
+        amount = np.array([row[3] or 0 for row in rows], dtype=float)
+        np.add.at(spend, (u, k, day), amount)
+        np.add.at(recurring_spent, (u[is_recurring], k[is_recurring]), amount[is_recurring])
+    
+    for category_id, monthly_limit in for_users(
+            session.query(Budget.category_id, Budget.monthly_limit), Budget.user_id).all():
+        if category_id in slots:
+            limits[slots[category_id]] = monthly_limit
+    
+    for recurring in for_users(session.query(RecurringExpense).filter(
+            RecurringExpense.is_active == True,
+            RecurringExpense.next_due_date <= month_end), RecurringExpense.user_id).all():
+        if recurring.category_id in slots:
+            recurring_due[slots[recurring.category_id]] += recurring.amount * len(recurring.due_dates_until(month_end))
+    
+    spent = spend.sum(axis=2)
+    daily_rate = (spent - recurring_spent) / today.day
+    projected = spent + daily_rate * (days_in_month - today.day) + recurring_due
+    projected_percentage = np.divide(projected * 100, limits, out=np.zeros(shape), where=limits > 0)
+    
+    forecasts = {user_id: {} for user_id, _ in users}
+    for category_id, (u, k) in slots.items():
+        forecasts[users[u][0]][category_id] = {
+            'spent': float(spent[u, k]),
+            'recurring_spent': float(recurring_spent[u, k]),
+            'recurring_due': float(recurring_due[u, k]),
+            'daily_rate': float(daily_rate[u, k]),
+            'projected': float(projected[u, k]),
+            'limit': float(limits[u, k]) or None,
+            'projected_percentage': float(projected_percentage[u, k])
+        }
+    for user_id, version in users:
+        cache_user_entry(_forecast_cache, user_id,
+                         {'date': today, 'version': version or 0, 'categories': forecasts[user_id]},
+                         FORECAST_CACHE_MAX_USERS)
+    return forecasts
+
+def get_budget_forecast(user):
+    """Cached month-end forecast per category id for one user"""
+    today = datetime.now().date()
+    entry = _forecast_cache.get(user.id)
+    if entry and entry['date'] == today and entry['version'] == (user.data_version or 0):
+        return entry['categories']
+    return compute_forecasts([user.id], today)[user.id]
+
+def apply_expense_changes(user, previous_version, changes):
+    """Fold committed expense writes into the cached forecast and description index instead
+    of recomputing them.
+
+    changes holds (category_id, date, amount, description, +1/-1) tuples. The cache entry is
+    dropped when it did not match the version before this write or another write slipped in.
+    """
+    apply_description_changes(user, previous_version, changes)
+    entry = _forecast_cache.get(user.id)
+    if not entry:
+        return
+    if entry['version'] != previous_version or (user.data_version or 0) != previous_version + 1:
+        _forecast_cache.pop(user.id, None)
+        return
+    
+    month = (entry['date'].year, entry['date'].month)
+    days_in_month = calendar.monthrange(*month)[1]
+    for category_id, date, amount, description, weight in changes:
+        if (date.year, date.month) != month:
+            continue
+        forecast = entry['categories'].get(category_id)
+        if forecast is None:
+            _forecast_cache.pop(user.id, None)
+            return
+        forecast['spent'] += amount * weight
+        if is_recurring_expense(description):
+            forecast['recurring_spent'] += amount * weight
+        project_forecast(forecast, entry['date'].day, days_in_month)
+    entry['version'] = previous_version + 1
+
+# Description autocomplete
+_description_index = {}
+DESCRIPTION_INDEX_MAX_ENTRIES = 5000
+DESCRIPTION_INDEX_MAX_USERS = 10000
+DESCRIPTION_RECENCY_HALF_LIFE_DAYS = 30
+DESCRIPTION_MAX_SUGGESTIONS = 8
+
+class DescriptionIndex:
+    """A user's distinct expense descriptions kept in sorted order, so every description
+    starting with a prefix is one bisect range. Each entry remembers how often and when it
+    was last used, and the category and amount it was last used with."""
+    
+    def __init__(self, version):
+        self.version = version
+        self.keys = []
+        self.entries = {}
+    
+    def add(self, description, category_id, amount, date, weight=1):
+        """Count a use of description, or take one back with weight=-1"""
+        key = description.strip().lower()
+        entry = self.entries.get(key)
+        if entry is None:
+            if weight < 0:
+                return
+            entry = self.entries[key] = {'description': description.strip(), 'count': 0, 'last_used': date,
+                                         'category_id': category_id, 'amount': amount}
+            bisect.insort(self.keys, key)
+        entry['count'] += weight
+        if entry['count'] <= 0:
+            del self.entries[key]
+            del self.keys[bisect.bisect_left(self.keys, key)]
+        elif weight > 0 and date >= entry['last_used']:
+            entry.update(description=description.strip(), last_used=date, category_id=category_id, amount=amount)
+    
+    def suggest(self, prefix, today, limit=DESCRIPTION_MAX_SUGGESTIONS):
+        """Descriptions starting with prefix, ranked by use count decayed by time since last use"""
+        prefix = prefix.strip().lower()
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + '\uffff')
+        
+        def score(key):
+            entry = self.entries[key]
+            age = max((today - entry['last_used']).days, 0)
+            return entry['count'] * 0.5 ** (age / DESCRIPTION_RECENCY_HALF_LIFE_DAYS)
+        
+        return [self.entries[key] for key in heapq.nlargest(limit, self.keys[start:end], key=score)]
+
+def build_description_index(user):
+    """Index the user's most used descriptions. SQLite fills the bare category_id and amount
+    columns from the row holding max(date), i.e. the last use of each description."""
+    index = DescriptionIndex(user.data_version or 0)
+    rows = db.session.query(
+        Expense.description, func.count(Expense.id).label('uses'), func.max(Expense.date),
+        Expense.category_id, Expense.amount
+    ).filter(Expense.user_id == user.id).group_by(Expense.description).order_by(
+        db.desc('uses')).limit(DESCRIPTION_INDEX_MAX_ENTRIES).all()
+    for description, count, last_used, category_id, amount in rows:
+        if description.strip() and not is_recurring_expense(description):
+            index.add(description, category_id, amount, last_used, count)
+    return index
+
+def get_description_index(user):
+    """Cached description index, rebuilt only when writes it was not told about happened"""
+    index = _description_index.get(user.id)
+    if index is None or index.version != (user.data_version or 0):
+        index = cache_user_entry(_description_index, user.id, build_description_index(user),
+                                 DESCRIPTION_INDEX_MAX_USERS)
+    return index
+
+def apply_description_changes(user, previous_version, changes):
+    index = _description_index.get(user.id)
+    if not index:
+        return
+    if index.version != previous_version or (user.data_version or 0) != previous_version + 1:
+        _description_index.pop(user.id, None)
+        return
+    for category_id, date, amount, description, weight in changes:
+        if description.strip() and not is_recurring_expense(description):
+            index.add(description, category_id, amount, date, weight)
+    index.version = previous_version + 1
+
+# Spending time series
+_series_cache = {}
+SERIES_CACHE_KEYS_PER_USER = 16
+SERIES_CACHE_MAX_USERS = 10000
+SERIES_MAX_PERIODS = 1000
+SERIES_PERIODS = {
+    'daily': lambda column: func.strftime('%Y-%m-%d', column),
+    'weekly': lambda column: func.date(column, 'weekday 0', '-6 days'),  # Monday of the week
+    'monthly': lambda column: func.strftime('%Y-%m', column)
+}
+
+def series_period_labels(granularity, start, end):
+    """Every period label between start and end, matching the SQL period expressions"""
+    labels = []
+    if granularity == 'monthly':
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            labels.append(f'{year:04d}-{month:02d}')
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return labels
+    
+    day = start - timedelta(days=start.weekday()) if granularity == 'weekly' else start
+    step = timedelta(weeks=1) if granularity == 'weekly' else timedelta(days=1)
+    while day <= end:
+        labels.append(day.strftime('%Y-%m-%d'))
+        day += step
+    return labels
+
+def compute_spending_series(user, granularity, start, end):
+    """Per-category totals, running totals and period-over-period change in one SQL query"""
+    def rows_for(model):
+        return select(model.category_id, model.date, model.amount).where(
+            model.user_id == user.id, model.date >= start, model.date <= end)
+    
+    source = rows_for(Expense)
+    archive_horizon = datetime.now().date() - timedelta(days=app.config['ARCHIVE_AFTER_DAYS'])
+    if app.config['ARCHIVE_AFTER_DAYS'] > 0 and start < archive_horizon:
+        source = union_all(source, rows_for(ArchivedExpense))
+    source = source.subquery()
+    
+    period = SERIES_PERIODS[granularity](source.c.date)
+    grouped = select(
+        source.c.category_id,
+        period.label('period'),
+        func.sum(source.c.amount).label('total')
+    ).group_by(source.c.category_id, period).subquery()
+    
+    window = {'partition_by': grouped.c.category_id, 'order_by': grouped.c.period}
+    rows = db.session.execute(select(
+        grouped.c.category_id,
+        grouped.c.period,
+        grouped.c.total,
+        func.sum(grouped.c.total).over(**window).label('running_total'),
+        func.lag(grouped.c.period).over(**window).label('previous_period'),
+        func.lag(grouped.c.total).over(**window).label('previous_total')
+    ).order_by(grouped.c.category_id, grouped.c.period)).all()
+    
+    # Align the sparse SQL rows onto every period so gaps read as zero spend
+    labels = series_period_labels(granularity, start, end)
+    position = {label: i for i, label in enumerate(labels)}
+    categories = {c.id: c for c in get_user_categories(user)}
+    series = {}
+    for category_id, period_label, total, running_total, previous_period, previous_total in rows:
+        if period_label not in position or category_id not in categories:
+            continue
+        i = position[period_label]
+        entry = series.get(category_id)
+        if entry is None:
+            category = categories[category_id]
+            entry = series[category_id] = {
+                'category_id': category_id,
+                'category': category.name,
+                'color': category.color,
+                'totals': [0.0] * len(labels),
+                'running_totals': [None] * len(labels),
+                'changes': [None] * len(labels)
+            }
+        entry['totals'][i] = round(total, 2)
+        entry['running_totals'][i] = round(running_total, 2)
+        if previous_period is not None and i > 0 and previous_period == labels[i - 1]:
+            entry['changes'][i] = round(total - previous_total, 2)
+        elif i > 0:
+            entry['changes'][i] = round(total, 2)
+    
+    for entry in series.values():
+        running = 0.0
+        for i in range(len(labels)):
+            if entry['running_totals'][i] is None:
+                entry['running_totals'][i] = running
+                if i > 0:
+                    entry['changes'][i] = round(0 - entry['totals'][i - 1], 2)
+            running = entry['running_totals'][i]
+    
+    return {
+        'granularity': granularity,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'periods': labels,
+        'series': sorted(series.values(), key=lambda entry: -sum(entry['totals'])),
+        'totals': [round(sum(entry['totals'][i] for entry in series.values()), 2) for i in range(len(labels))]
+    }
+
+def get_spending_series(user, granularity, start, end):
+    """compute_spending_series cached per user until the user's data version changes"""
+    version = user.data_version or 0
+    key = (granularity, start, end)
+    cached = _series_cache.get(user.id)
+    if cached is None or cached['version'] != version:
+        cached = cache_user_entry(_series_cache, user.id, {'version': version, 'results': {}},
+                                  SERIES_CACHE_MAX_USERS)
+    if key not in cached['results']:
+        if len(cached['results']) >= SERIES_CACHE_KEYS_PER_USER:
+            cached['results'].pop(next(iter(cached['results'])))
+        cached['results'][key] = compute_spending_series(user, granularity, start, end)
+    return cached['results'][key]
+
+# Budget threshold alerts
+def seed_month_total(session, user_id, category_id, month):
+    """Start a category's running total for a month from the rows already written, archive included"""
+    live = session.execute(select(func.coalesce(func.sum(Expense.amount), 0)).where(
+        Expense.category_id == category_id, func.strftime('%Y-%m', Expense.date) == month)).scalar()
+    archived = session.execute(select(func.coalesce(func.sum(ArchiveRollup.total), 0)).where(
+        ArchiveRollup.category_id == category_id, ArchiveRollup.month == month)).scalar()
+    session.execute(CategoryMonthTotal.__table__.insert().values(
+        user_id=user_id, category_id=category_id, month=month, total=live + archived))
+    return live + archived
+
+def apply_budget_spend(session, user_id, changes):
+    """Fold (category_id, date, amount delta) changes into the running month totals and raise
+    an alert for every budget that crossed a threshold this month; backdated writes, restores
+    and imports only update the totals. Must run after the expense rows are flushed: a total
+    seen for the first time is seeded from them, change included."""
+    deltas = defaultdict(float)
+    for category_id, date, amount in changes:
+        deltas[(category_id, date.strftime('%Y-%m'))] += amount
+    limits = dict(session.execute(select(Budget.category_id, Budget.monthly_limit).where(
+        Budget.user_id == user_id, Budget.category_id.in_({category_id for category_id, _ in deltas}))).all())
+    
+    table = CategoryMonthTotal.__table__
+    current_month = datetime.now().strftime('%Y-%m')
+    alerts = 0
+    for (category_id, month), delta in deltas.items():
+        total = session.execute(table.update().where(
+            table.c.category_id == category_id, table.c.month == month
+        ).values(total=table.c.total + delta).returning(table.c.total)).scalar()
+        if total is None:
+            total = seed_month_total(session, user_id, category_id, month)
+        if month != current_month:
+            continue
+        
+        limit = limits.get(category_id)
+        crossed = [t for t in app.config['BUDGET_ALERT_THRESHOLDS'] if limit and total - delta < limit * t / 100 <= total]
+        if not crossed:
+            continue
+        alert = sqlite_insert(BudgetAlert.__table__).values(
+            user_id=user_id, category_id=category_id, month=month, threshold=max(crossed),
+            spent=total, monthly_limit=limit, seen=False, created_at=datetime.utcnow())
+        # Re-crossing a threshold already reported this month is not news; crossing a higher one is
+        result = session.execute(alert.on_conflict_do_update(
+            index_elements=['category_id', 'month'],
+            set_={'threshold': alert.excluded.threshold, 'spent': alert.excluded.spent,
+                  'monthly_limit': alert.excluded.monthly_limit, 'seen': False,
+                  'created_at': alert.excluded.created_at},
+            where=BudgetAlert.__table__.c.threshold < alert.excluded.threshold
+        ))
+        alerts += result.rowcount
+    if alerts:
+        refresh_pending_alerts(session, user_id)
+
+def refresh_pending_alerts(session, user_id):
+    """Set User.pending_alerts to the number of unseen alerts. Counted rather than adjusted,
+    so an unseen alert moving from 80% to 100% or a deleted alert can't make it drift."""
+    unseen = session.execute(select(func.count(BudgetAlert.id)).where(
+        BudgetAlert.user_id == user_id, BudgetAlert.seen == False)).scalar()
+    session.execute(User.__table__.update().where(User.__table__.c.id == user_id).values(pending_alerts=unseen))
+
+@event.listens_for(Session, 'after_flush')
+def track_expense_writes(session, flush_context):
+    """Turn ORM expense inserts, edits and deletes into (category_id, date, amount, +1/-1) changes"""
+    deleted_users = {obj.id for obj in session.deleted if isinstance(obj, User)}
+    changes = defaultdict(list)
+    for obj in session.new:
+        if isinstance(obj, Expense):
+            changes[obj.user_id].append((obj.category_id, obj.date, obj.amount, 1))
+    for obj in session.deleted:
+        if isinstance(obj, Expense) and obj.user_id not in deleted_users:
+            changes[obj.user_id].append((obj.category_id, obj.date, obj.amount, -1))
+    for obj in session.dirty:
+        if not isinstance(obj, Expense) or not session.is_modified(obj, include_collections=False):
+            continue
+        attrs = inspect(obj).attrs
+        old = [attrs[key].history.deleted[0] if attrs[key].history.deleted else getattr(obj, key)
+               for key in ('category_id', 'date', 'amount')]
+        if old != [obj.category_id, obj.date, obj.amount]:
+            changes[obj.user_id] += [(*old, -1), (obj.category_id, obj.date, obj.amount, 1)]
+    for user_id, user_changes in changes.items():
+        record_expense_changes(session, user_id, user_changes)
+    track_category_sketch_writes(session)
+
+def track_category_sketch_writes(session):
+    """Keep the per category name rollups in step with ORM renames of categories and with
+    sketches deleted along with their user"""
+    deleted_names = {obj.id: obj.name for obj in session.deleted if isinstance(obj, Category)}
+    deleted_sketches = [obj for obj in session.deleted if isinstance(obj, AmountSketch)]
+    parts = defaultdict(list)
+    if deleted_sketches:
+        names = dict(session.execute(select(Category.id, Category.name).where(Category.id.in_(
+            {obj.category_id for obj in deleted_sketches} - set(deleted_names)))).all())
+        names.update(deleted_names)
+        for obj in deleted_sketches:
+            parts[(names.get(obj.category_id), obj.month)].append(
+                (QuantileSketch.loads(obj.buckets, obj.count, obj.total), -1))
+    for obj in session.dirty:
+        if not isinstance(obj, Category):
+            continue
+        history = inspect(obj).attrs.name.history
+        if history.deleted and history.deleted[0] != obj.name:
+            for (_, month), sketches in amount_sketch_parts(session, AmountSketch.category_id == obj.id).items():
+                parts[(history.deleted[0], month)] += [(sketch, -1) for sketch, _ in sketches]
+                parts[(obj.name, month)] += sketches
+    if parts:
+        apply_category_sketches(session, parts)
+
+def reset_budget_spend(user_id, category_ids):
+    """Drop running totals after bulk moves; they are re-seeded on the next write"""
+    CategoryMonthTotal.query.filter(CategoryMonthTotal.user_id == user_id,
+                                    CategoryMonthTotal.category_id.in_(category_ids)).delete(synchronize_session=False)
+
+@app.context_processor
+def inject_budget_alerts():
+    # pending_alerts comes with current_user, so pages without new alerts cost no query
+    if not isinstance(current_user, User) or not current_user.pending_alerts:
+        return {'budget_alerts': []}
+    alerts = BudgetAlert.query.filter_by(user_id=current_user.id, seen=False).order_by(
+        BudgetAlert.created_at.desc()).limit(5).all()
+    return {'budget_alerts': alerts, 'alert_categories': {c.id: c for c in get_user_categories(current_user)}}
+
+def mark_budget_alerts_seen(user):
+    BudgetAlert.query.filter_by(user_id=user.id, seen=False).update({BudgetAlert.seen: True}, synchronize_session=False)
+    user.pending_alerts = 0
+    db.session.commit()
+
+# Amount distribution sketches
+SKETCH_RELATIVE_ACCURACY = 0.01
+SKETCH_MIN_AMOUNT = 0.01
+SKETCH_QUANTILES = (0.5, 0.9, 0.95)
+
+class QuantileSketch:
+    """Mergeable quantile sketch over expense amounts (a DDSketch-style log histogram).
+
+    Amounts fall into buckets whose bounds grow by a constant factor, so any quantile is
+    answered within SKETCH_RELATIVE_ACCURACY of the true value. Merging two sketches adds
+    their bucket counts, and an amount can be removed again when an expense is edited or
+    deleted. Amounts below SKETCH_MIN_AMOUNT, refunds included, are counted as zero.
+    """
+    gamma = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+    
+    def __init__(self, buckets=None, zero=0, count=0, total=0.0):
+        self.buckets = buckets or {}
+        self.zero = zero
+        self.count = count
+        self.total = total
+    
+    @classmethod
+    def loads(cls, data, count=0, total=0.0):
+        buckets = json.loads(data) if data else {}
+        zero = buckets.pop('z', 0)
+        return cls({int(key): n for key, n in buckets.items()}, zero, count, total)
+    
+    def dumps(self):
+        return json.dumps({'z': self.zero, **{str(key): n for key, n in self.buckets.items()}}, separators=(',', ':'))
+    
+    def add(self, amount, weight=1):
+        """Add an amount, or remove one with weight=-1. Non-finite amounts have no bucket
+        and are left out rather than failing the write that carried them."""
+        if not math.isfinite(amount):
+            return
+        self.count += weight
+        self.total += amount * weight
+        if amount < SKETCH_MIN_AMOUNT:
+            self.zero = max(self.zero + weight, 0)
+            return
+        key = math.ceil(math.log(amount, self.gamma))
+        n = self.buckets.get(key, 0) + weight
+        if n > 0:
+            self.buckets[key] = n
+        else:
+            self.buckets.pop(key, None)
+    
+    def merge(self, other, weight=1):
+        """Add another sketch's amounts, or take them out again with weight=-1"""
+        for key, n in other.buckets.items():
+            n = self.buckets.get(key, 0) + n * weight
+            if n > 0:
+                self.buckets[key] = n
+            else:
+                self.buckets.pop(key, None)
+        self.zero = max(self.zero + other.zero * weight, 0)
+        self.count += other.count * weight
+        self.total += other.total * weight
+        return self
+    
+    def quantile(self, q):
+        """Amount at quantile q (0..1), or None for an empty sketch"""
+        rank = q * (self.zero + sum(self.buckets.values()) - 1)
+        if rank < 0:
+            return None
+        seen = self.zero
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+    
+    def histogram(self, edges):
+        """Counts of amounts in [edges[i], edges[i + 1]), the last band open-ended"""
+        counts = [0] * len(edges)
+        counts[0] += self.zero
+        for key, n in self.buckets.items():
+            counts[max(bisect.bisect_right(edges, 2 * self.gamma ** key / (self.gamma + 1)) - 1, 0)] += n
+        return counts
+
+def build_amount_sketches(session, category_ids, months=None):
+    """Sketches rebuilt from the live and archived rows of some categories, keyed by
+    (user_id, category_id, month)"""
+    sketches = defaultdict(QuantileSketch)
+    for model in (Expense, ArchivedExpense):
+        month = func.strftime('%Y-%m', model.date)
+        query = select(model.user_id, model.category_id, month, model.amount).where(model.category_id.in_(category_ids))
+        if months is not None:
+            query = query.where(month.in_(months))
+        for user_id, category_id, month, amount in session.execute(query):
+            sketches[(user_id, category_id, month)].add(amount)
+    return sketches
+
+def store_amount_sketches(session, sketches):
+    rows = [{'user_id': user_id, 'category_id': category_id, 'month': month, 'count': sketch.count,
+             'total': sketch.total, 'buckets': sketch.dumps()}
+            for (user_id, category_id, month), sketch in sketches.items() if sketch.count]
+    if rows:
+        session.execute(AmountSketch.__table__.insert(), rows)
+
+def apply_amount_sketches(session, user_id, changes):
+    """Add and remove changed amounts in the per category-month sketches and their rollups.
+    Like the running totals, a sketch seen for the first time is built from the rows already
+    flushed."""
+    grouped = defaultdict(list)
+    for category_id, date, amount, weight in changes:
+        grouped[(category_id, date.strftime('%Y-%m'))].append((amount, weight))
+    names = dict(session.execute(select(Category.id, Category.name).where(
+        Category.id.in_({category_id for category_id, _ in grouped}))).all())
+    
+    table = AmountSketch.__table__
+    parts = defaultdict(list)
+    for (category_id, month), amounts in grouped.items():
+        row = session.execute(select(table.c.id, table.c.buckets, table.c.count, table.c.total).where(
+            table.c.category_id == category_id, table.c.month == month)).first()
+        if row is None:
+            built = build_amount_sketches(session, [category_id], [month])
+            store_amount_sketches(session, built)
+            parts[(names.get(category_id), month)] += [(sketch, 1) for sketch in built.values()]
+            continue
+        sketch = QuantileSketch.loads(row.buckets, row.count, row.total)
+        added, removed = QuantileSketch(), QuantileSketch()
+        for amount, weight in amounts:
+            sketch.add(amount, weight)
+            (added if weight > 0 else removed).add(amount)
+        session.execute(table.update().where(table.c.id == row.id).values(
+            count=sketch.count, total=sketch.total, buckets=sketch.dumps()))
+        parts[(names.get(category_id), month)] += [(added, 1), (removed, -1)]
+    apply_category_sketches(session, parts)
+
+def amount_sketch_parts(session, *where, weight=1, parts=None):
+    """Stored sketches matching where as (sketch, weight) pairs per (category name, month),
+    ready for apply_category_sketches"""
+    parts = defaultdict(list) if parts is None else parts
+    for name, month, count, total, buckets in session.execute(select(
+            Category.name, AmountSketch.month, AmountSketch.count, AmountSketch.total, AmountSketch.buckets
+    ).join(Category, Category.id == AmountSketch.category_id).where(*where)):
+        parts[(name, month)].append((QuantileSketch.loads(buckets, count, total), weight))
+    return parts
+
+def apply_category_sketches(session, parts):
+    """Fold (sketch, +1/-1) changes per (category name, month) into the rollups. A rollup
+    seen for the first time is built from the per-user sketches, which already hold the change."""
+    table = CategoryAmountSketch.__table__
+    for (name, month), sketches in parts.items():
+        if name is None:
+            continue
+        row = session.execute(select(table.c.id, table.c.buckets, table.c.count, table.c.total).where(
+            table.c.category_name == name, table.c.month == month)).first()
+        if row is None:
+            rebuild_category_sketches(session, [name], [month])
+            continue
+        rollup = QuantileSketch.loads(row.buckets, row.count, row.total)
+        for sketch, weight in sketches:
+            rollup.merge(sketch, weight)
+        session.execute(table.update().where(table.c.id == row.id).values(
+            count=rollup.count, total=rollup.total, buckets=rollup.dumps()))
+
+def rebuild_category_sketches(session, names=None, months=None):
+    """Rebuild the rollups of some category names and months, or all of them, from the
+    per-user sketches. Works on a session or a plain connection."""
+    table = CategoryAmountSketch.__table__
+    where = []
+    delete = table.delete()
+    if names is not None:
+        where.append(Category.name.in_(names))
+        delete = delete.where(table.c.category_name.in_(names))
+    if months is not None:
+        where.append(AmountSketch.month.in_(months))
+        delete = delete.where(table.c.month.in_(months))
+    session.execute(delete)
+    rows = []
+    for (name, month), sketches in amount_sketch_parts(session, *where).items():
+        rollup = QuantileSketch()
+        for sketch, _ in sketches:
+            rollup.merge(sketch)
+        if rollup.count:
+            rows.append({'category_name': name, 'month': month, 'count': rollup.count,
+                         'total': rollup.total, 'buckets': rollup.dumps()})
+    if rows:
+        session.execute(table.insert(), rows)
+
+def rebuild_amount_sketches(user_id, category_ids):
+    """Rebuild the sketches of categories whose expenses were moved in bulk"""
+    selected = (AmountSketch.user_id == user_id, AmountSketch.category_id.in_(category_ids))
+    parts = amount_sketch_parts(db.session, *selected, weight=-1)
+    AmountSketch.query.filter(*selected).delete(synchronize_session=False)
+    store_amount_sketches(db.session, build_amount_sketches(db.session, category_ids))
+    apply_category_sketches(db.session, amount_sketch_parts(db.session, *selected, parts=parts))
+
+def backfill_amount_sketches():
+    """Build sketches for category-months that have expenses but no sketch yet (data written
+    before sketches existed); returns how many were built"""
+    live = select(Expense.category_id, func.strftime('%Y-%m', Expense.date))
+    archived = select(ArchivedExpense.category_id, func.strftime('%Y-%m', ArchivedExpense.date))
+    missing = set(db.session.execute(union(live, archived)).all()) - \
+        set(db.session.execute(select(AmountSketch.category_id, AmountSketch.month)).all())
+    if not missing:
+        return 0
+    sketches = build_amount_sketches(db.session, {category_id for category_id, _ in missing},
+                                     {month for _, month in missing})
+    store_amount_sketches(db.session, {key: sketch for key, sketch in sketches.items() if key[1:] in missing})
+    apply_category_sketches(db.session, amount_sketch_parts(
+        db.session, tuple_(AmountSketch.category_id, AmountSketch.month).in_(missing)))
+    db.session.commit()
+    return len(missing)
+
+DISTRIBUTION_BANDS = (0, 100, 500, 1000, 5000, 10000, 50000)
+
+def amount_distribution(start, end):
+    """Amount quantiles per category, an amount histogram and per-user monthly spend
+    quantiles for months start..end (YYYY-MM), merged from the per category name rollups"""
+    rows = [row for shard_rows in fan_out(lambda s: s.query(
+        CategoryAmountSketch.category_name, CategoryAmountSketch.count,
+        CategoryAmountSketch.total, CategoryAmountSketch.buckets
+    ).filter(CategoryAmountSketch.month.between(start, end)).all()) for row in shard_rows]
+    user_months = [total for shard_rows in fan_out(lambda s: s.query(func.sum(AmountSketch.total)).filter(
+        AmountSketch.month.between(start, end)).group_by(AmountSketch.user_id, AmountSketch.month).all())
+        for total, in shard_rows]
+    
+    by_category = defaultdict(QuantileSketch)
+    overall = QuantileSketch()
+    for name, count, total, buckets in rows:
+        sketch = QuantileSketch.loads(buckets, count, total)
+        by_category[name].merge(sketch)
+        overall.merge(sketch)
+    
+    def summary(sketch):
+        return {'count': sketch.count, 'total': sketch.total,
+                **{f'p{int(q * 100)}': sketch.quantile(q) for q in SKETCH_QUANTILES}}
+    
+    band_counts = overall.histogram(DISTRIBUTION_BANDS)
+    monthly_spend = np.array(user_months, dtype=float)
+    return {
+        'categories': sorted(({'name': name, **summary(sketch)} for name, sketch in by_category.items()),
+                             key=lambda c: c['count'], reverse=True),
+        'overall': summary(overall),
+        'bands': [{
+            'label': f'₹{low:,}+' if high is None else f'₹{low:,} – ₹{high:,}',
+            'count': n,
+            'percentage': n / overall.count * 100 if overall.count else 0
+        } for low, high, n in zip(DISTRIBUTION_BANDS, DISTRIBUTION_BANDS[1:] + (None,), band_counts)],
+        'user_months': {'count': len(monthly_spend), **{
+            f'p{int(q * 100)}': float(np.percentile(monthly_spend, q * 100)) if len(monthly_spend) else None
+            for q in SKETCH_QUANTILES}}
+    }
+
+def record_expense_changes(session, user_id, changes):
+    """Feed (category_id, date, amount, +1/-1) expense changes to the budget totals and sketches"""
+    apply_budget_spend(session, user_id, [(category_id, date, amount * weight)
+                                          for category_id, date, amount, weight in changes])
+    apply_amount_sketches(session, user_id, changes)
+
+# Upcoming obligations calendar
+_obligations_cache = {}
+OBLIGATIONS_MAX_MONTHS = 24
+OBLIGATIONS_CACHE_KEYS_PER_USER = 4
+OBLIGATIONS_CACHE_MAX_USERS = 10000
+
+def compute_obligations(user, today, months):
+    """Every due date of the user's active recurring expenses from today to the end of the
+    months-th month, grouped by month and day. Unprocessed dates before today are collapsed
+    into one overdue item per schedule with their count and the earliest date."""
+    year, month = divmod(today.month - 1 + months - 1, 12)
+    end = datetime(today.year + year, month + 1, calendar.monthrange(today.year + year, month + 1)[1]).date()
+    categories = {c.id: c for c in get_user_categories(user)}
+    
+    calendar_months = {}
+    for offset in range(months):
+        year, month = divmod(today.month - 1 + offset, 12)
+        first = datetime(today.year + year, month + 1, 1)
+        calendar_months[first.strftime('%Y-%m')] = {
+            'month': first.strftime('%Y-%m'), 'label': first.strftime('%B %Y'),
+            'total': 0, 'count': 0, 'days': defaultdict(list)
+        }
+    overdue = []
+    
+    schedules = RecurringExpense.query.filter(
+        RecurringExpense.user_id == user.id,
+        RecurringExpense.is_active == True,
+        RecurringExpense.next_due_date <= end
+    ).all()
+    for recurring in schedules:
+        category = categories.get(recurring.category_id)
+        anchor = recurring.schedule_anchor
+        
+        def item(due):
+            return {
+                'id': recurring.id,
+                'description': recurring.description,
+                'amount': recurring.amount,
+                'date': due,
+                'frequency': recurring.frequency,
+                'auto_add': bool(recurring.auto_add),
+                'category': category.name if category else None,
+                'icon': category.icon if category else 'fas fa-tag',
+                'color': category.color if category else '#667eea'
+            }
+        
+        if recurring.next_due_date < today:
+            since, count = recurrence_span(anchor, recurring.frequency, recurring.next_due_date,
+                                           today - timedelta(days=1))
+            if count:
+                overdue.append(dict(item(since), count=count, total=recurring.amount * count))
+        for due in recurrence_dates(anchor, recurring.frequency, max(recurring.next_due_date, today), end):
+            bucket = calendar_months[due.strftime('%Y-%m')]
+            bucket['days'][due].append(item(due))
+            bucket['total'] += recurring.amount
+            bucket['count'] += 1
+    
+    for bucket in calendar_months.values():
+        bucket['days'] = [{'date': day, 'items': bucket['days'][day]} for day in sorted(bucket['days'])]
+    overdue.sort(key=lambda item: item['date'])
+    return {
+        'start': today,
+        'end': end,
+        'months': list(calendar_months.values()),
+        'overdue': overdue,
+        'overdue_count': sum(item['count'] for item in overdue),
+        'overdue_total': sum(item['total'] for item in overdue),
+        'total': sum(bucket['total'] for bucket in calendar_months.values())
+    }
+
+def get_upcoming_obligations(user, months):
+    """compute_obligations cached per user until the day, the user's data or their categories change"""
+    today = datetime.now().date()
+    version = (today, user.data_version or 0, user.categories_version or 0)
+    cached = _obligations_cache.get(user.id)
+    if cached is None or cached['version'] != version:
+        cached = cache_user_entry(_obligations_cache, user.id, {'version': version, 'results': {}},
+                                  OBLIGATIONS_CACHE_MAX_USERS)
+    if months not in cached['results']:
+        if len(cached['results']) >= OBLIGATIONS_CACHE_KEYS_PER_USER:
+            cached['results'].pop(next(iter(cached['results'])))
+        cached['results'][months] = compute_obligations(user, today, months)
+    return cached['results'][months]
+
+# Read-only analytics snapshot
+_snapshot_lock = threading.Lock()
+_snapshot_sessionmaker = None
+_snapshot_refresher = None
+_snapshot_refresher_lock = threading.Lock()
+
+def analytics_snapshot_enabled():
+    return app.config['ANALYTICS_SNAPSHOT_MAX_AGE'] > 0 and db.engine.dialect.name == 'sqlite'
+
+def analytics_snapshot_age():
+    """Seconds since the snapshot was taken, or infinity when there is none"""
+    try:
+        return time.time() - os.path.getmtime(app.config['ANALYTICS_SNAPSHOT_PATH'])
+    except OSError:
+        return float('inf')
+
+def refresh_analytics_snapshot():
+    """Copy the live database with VACUUM INTO and swap it in atomically. The copy is one
+    read transaction, so it is consistent and never restarts because of concurrent writes."""
+    path = app.config['ANALYTICS_SNAPSHOT_PATH']
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with _snapshot_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            with db.engine.connect() as connection:
+                connection.connection.driver_connection.execute('VACUUM INTO ?', (temp_path,))
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+def request_snapshot_refresh():
+    """Refresh the snapshot in a background thread. The lease keeps other processes from
+    copying the database again within ANALYTICS_SNAPSHOT_MAX_AGE."""
+    global _snapshot_refresher
+    
+    def refresh():
+        with app.app_context():
+            try:
+                if claim_lease('analytics_snapshot', app.config['ANALYTICS_SNAPSHOT_MAX_AGE']):
+                    refresh_analytics_snapshot()
+            except Exception:
+                app.logger.exception('Analytics snapshot refresh failed')
+    
+    with _snapshot_refresher_lock:
+        if _snapshot_refresher is None or not _snapshot_refresher.is_alive():
+            _snapshot_refresher = threading.Thread(target=refresh, name='monify-snapshot', daemon=True)
+            _snapshot_refresher.start()
+
+def reporting_session():
+    """Session for admin reports. Reads the snapshot so long scans never hold locks on the
+    live database. A stale snapshot is still served while a fresh one is copied in the
+    background; when there is no copy yet, or it is older than ANALYTICS_SNAPSHOT_STALE_LIMIT
+    max ages, reports read the live database."""
+    global _snapshot_sessionmaker
+    if not analytics_snapshot_enabled():
+        return db.session
+    
+    if 'reporting_session' not in g:
+        age = analytics_snapshot_age()
+        if age > app.config['ANALYTICS_SNAPSHOT_MAX_AGE']:
+            request_snapshot_refresh()
+        if age > app.config['ANALYTICS_SNAPSHOT_MAX_AGE'] * app.config['ANALYTICS_SNAPSHOT_STALE_LIMIT']:
+            return db.session
+        if _snapshot_sessionmaker is None:
+            # NullPool so every session opens the file that is current at that moment
+            engine = create_engine(f"sqlite:///file:{app.config['ANALYTICS_SNAPSHOT_PATH']}?mode=ro&uri=true",
+                                   poolclass=NullPool)
+            _snapshot_sessionmaker = sessionmaker(bind=engine, query_cls=FlaskQuery)
+        g.snapshot_taken_at = datetime.fromtimestamp(os.path.getmtime(app.config['ANALYTICS_SNAPSHOT_PATH']))
+        g.reporting_session = _snapshot_sessionmaker()
+    return g.reporting_session
+
+@app.teardown_appcontext
+def close_reporting_session(exception=None):
+    reporting = g.pop('reporting_session', None)
+    if reporting is not None:
+        reporting.close()
+    for shard_session in g.pop('shard_sessions', []):
+        shard_session.close()
+
+_shard_sessionmaker = sessionmaker(class_=ShardRoutingSession, db=db, query_cls=FlaskQuery)
+
+def shard_sessions():
+    """One session per shard for cross-tenant reports, kept open until the request ends
+    so templates can still lazy-load relationships"""
+    if 'shard_sessions' not in g:
+        g.shard_sessions = [_shard_sessionmaker(info={'shard': shard}) for shard in all_shards()]
+    return g.shard_sessions
+
+def fan_out(query):
+    """Run query(session) on every shard in parallel and return the results in shard order.
+    Without sharding it runs once on the reporting session."""
+    if not app.config['SHARD_COUNT']:
+        return [query(reporting_session())]
+    
+    def run(shard_session):
+        with app.app_context():
+            return query(shard_session)
+    
+    sessions = shard_sessions()
+    with ThreadPoolExecutor(max_workers=min(len(sessions), app.config['SHARD_FANOUT_WORKERS'])) as pool:
+        # Each task gets a copy of the caller's context so query tracking sees shard queries
+        futures = [pool.submit(contextvars.copy_context().run, run, s) for s in sessions]
+        return [future.result() for future in futures]
+
+MonthlyTotal = namedtuple('MonthlyTotal', ['month', 'total'])
+
+class FanOutPagination(Pagination):
+    """Pages through one ordered query run on every shard. Each shard returns its first
+    offset + per_page rows, which are merged on the sort key before the page is cut out."""
+    def _query_items(self):
+        build, key = self._query_args['query'], self._query_args['key']
+        end = self._query_offset + self.per_page
+        rows = heapq.merge(*fan_out(lambda s: build(s).limit(end).all()), key=key, reverse=True)
+        return list(islice(rows, self._query_offset, end))
+    
+    def _query_count(self):
+        build = self._query_args['query']
+        return sum(fan_out(lambda s: build(s).order_by(None).count()))
+
+def create_tenant_tables(drop=False):
+    """Create (or recreate) the tenant tables in every shard file"""
+    tables = [table for name, table in db.metadata.tables.items() if name in TENANT_TABLES]
+    for shard in range(app.config['SHARD_COUNT']):
+        engine = db.engines[f'shard_{shard}']
+        if drop:
+            db.metadata.drop_all(engine, tables=tables)
+        db.metadata.create_all(engine, tables=tables)
+
+# Schema upgrades
+def database_targets():
+    """(engine, tables) pairs: the main database and, when sharding, each shard's tenant tables"""
+    tenant_tables = [table for name, table in db.metadata.tables.items() if name in TENANT_TABLES]
+    return [(db.engine, list(db.metadata.sorted_tables))] + [
+        (db.engines[f'shard_{shard}'], tenant_tables) for shard in range(app.config['SHARD_COUNT'])]
+
+def add_missing_columns(connection, table):
+    """ALTER TABLE ADD COLUMN for model columns the table predates, filling existing rows
+    with the column default; also creates any missing indexes"""
+    preparer = connection.dialect.identifier_preparer
+    name = preparer.format_table(table)
+    existing = {row[1] for row in connection.exec_driver_sql(f'PRAGMA table_info({name})')}
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        connection.exec_driver_sql(f'ALTER TABLE {name} ADD COLUMN {preparer.quote(column.name)} '
+                                   f'{column.type.compile(dialect=connection.dialect)}')
+        if column.default is not None:
+            value = column.default.arg if column.default.is_scalar else column.default.arg(None)
+            process = column.type.bind_processor(connection.dialect)
+            connection.exec_driver_sql(f'UPDATE {name} SET {preparer.quote(column.name)} = ?',
+                                       (process(value) if process else value,))
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+
+def rebuild_with_autoincrement(connection, table):
+    """Recreate a table created without AUTOINCREMENT, keeping its rows and id high-water mark"""
+    preparer = connection.dialect.identifier_preparer
+    name, temp = preparer.format_table(table), preparer.quote(f'{table.name}__upgrade')
+    existing = {row[1] for row in connection.exec_driver_sql(f'PRAGMA table_info({name})')}
+    columns = ', '.join(preparer.quote(column.name) for column in table.columns if column.name in existing)
+    
+    ddl = str(CreateTable(table).compile(dialect=connection.dialect)).replace(f'TABLE {name} ', f'TABLE {temp} ', 1)
+    connection.exec_driver_sql(ddl)
+    connection.exec_driver_sql(f'INSERT INTO {temp} ({columns}) SELECT {columns} FROM {name}')
+    connection.exec_driver_sql(f'DROP TABLE {name}')
+    connection.exec_driver_sql(f'ALTER TABLE {temp} RENAME TO {name}')
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+
+def reserve_archived_expense_ids(connection):
+    """Keep new expense ids above every archived one. Live expenses that already reused an
+    archived id are given fresh ids so archiving them cannot collide."""
+    top = connection.execute(select(func.max(ArchivedExpense.id))).scalar()
+    if not top:
+        return
+    for (expense_id,) in connection.execute(select(Expense.id).where(
+            Expense.id.in_(select(ArchivedExpense.id))).order_by(Expense.id)).all():
+        top += 1
+        connection.execute(Expense.__table__.update().where(Expense.id == expense_id).values(id=top))
+        connection.execute(SyncChange.__table__.update().where(
+            SyncChange.kind == 'expense', SyncChange.object_id == expense_id).values(object_id=top))
+    connection.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'expense'")
+    connection.exec_driver_sql(
+        "INSERT INTO sqlite_sequence (name, seq) VALUES ('expense', max(?, (SELECT coalesce(max(id), 0) FROM expense)))",
+        (top,))
+
+def upgrade_database():
+    """Create missing tables and bring existing ones up to the current models without losing
+    data. Runs at startup in every process; the IMMEDIATE transaction makes concurrent
+    starts take turns, and each step checks before it changes anything."""
+    for engine, tables in database_targets():
+        with engine.connect() as connection:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+            db.metadata.create_all(connection, tables=tables)
+            schemas = dict(connection.exec_driver_sql("SELECT name, sql FROM sqlite_master WHERE type = 'table'").all())
+            for table in tables:
+                add_missing_columns(connection, table)
+                if table.dialect_options['sqlite']['autoincrement'] and 'AUTOINCREMENT' not in schemas[table.name]:
+                    rebuild_with_autoincrement(connection, table)
+                    if table is Expense.__table__:
+                        reserve_archived_expense_ids(connection)
+            if CategoryAmountSketch.__table__ in tables and \
+                    connection.execute(select(CategoryAmountSketch.id).limit(1)).first() is None:
+                # Roll up the sketches written before the rollup table existed
+                rebuild_category_sketches(connection)
+            connection.commit()
+
+@app.before_request
+def select_user_shard():
+    # Requests made by a signed-in user only ever touch that user's shard
+    if app.config['SHARD_COUNT']:
+        _active_shard.set(shard_for(current_user.id) if isinstance(current_user, User) else None)
+
+@app.context_processor
+def inject_snapshot_freshness():
+    return {'snapshot_taken_at': g.get('snapshot_taken_at')}
+
+@app.before_request
+def ensure_job_workers():
+    # Pick up jobs left in the queue by a previous process
+    if not _job_workers:
+        start_job_workers()
+
+# Query tracking (development aid for spotting N+1 lazy loads)
+class LazyLoadError(Exception):
+    pass
+
+class QueryStats:
+    """SQL statements and relationship lazy loads seen while a tracker is active"""
+    def __init__(self, threshold=0):
+        self.threshold = threshold
+        self.queries = 0
+        self.lazy_loads = defaultdict(int)
+        self.locations = {}
+    
+    def record_lazy_load(self, relationship, location):
+        self.lazy_loads[relationship] += 1
+        self.locations.setdefault(relationship, location)
+        if self.threshold and self.lazy_loads[relationship] == self.threshold + 1:
+            message = (f'{relationship} lazy-loaded more than {self.threshold} times '
+                       f'in one request, first at {self.locations[relationship]}; '
+                       f'eager-load it or query it in bulk')
+            if app.config['LAZY_LOAD_RAISE']:
+                raise LazyLoadError(message)
+            app.logger.warning(message)
+
+_query_trackers = contextvars.ContextVar('query_trackers', default=())
+
+@contextmanager
+def track_queries(threshold=0):
+    """Count the queries and lazy loads run inside the block. Lets a test hold a route
+    to a query budget:
+
+        with track_queries() as stats:
+            client.get('/expenses')
+        assert stats.queries <= 6
+    """
+    stats = QueryStats(threshold)
+    token = _query_trackers.set(_query_trackers.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _query_trackers.reset(token)
+
+def lazy_load_location():
+    """Template line (or else app.py line) that triggered the current lazy load"""
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        template = frame.f_globals.get('__jinja_template__')
+        if template is not None:
+            return f'{template.name}:{template.get_corresponding_lineno(frame.f_lineno)}'
+        if fallback is None and frame.f_code.co_filename == __file__:
+            fallback = f'app.py:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return fallback or 'unknown location'
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    for stats in _query_trackers.get():
+        stats.queries += 1
+
+@event.listens_for(Session, 'do_orm_execute')
+def count_lazy_load(orm_execute_state):
+    trackers = _query_trackers.get()
+    if not trackers or not orm_execute_state.is_relationship_load or orm_execute_state.lazy_loaded_from is None:
+        return
+    relationship = (f'{orm_execute_state.lazy_loaded_from.class_.__name__}.'
+                    f'{orm_execute_state.loader_strategy_path[-1].key}')
+    location = lazy_load_location()
+    for stats in trackers:
+        stats.record_lazy_load(relationship, location)
+
+@app.before_request
+def start_query_tracking():
+    if app.config['LAZY_LOAD_THRESHOLD']:
+        g.query_stats = QueryStats(app.config['LAZY_LOAD_THRESHOLD'])
+        g.query_tracking_token = _query_trackers.set(_query_trackers.get() + (g.query_stats,))
+
+@app.after_request
+def report_query_count(response):
+    if 'query_stats' in g:
+        response.headers['X-Query-Count'] = str(g.query_stats.queries)
+    return response
+
+@app.teardown_request
+def stop_query_tracking(exception=None):
+    token = g.pop('query_tracking_token', None)
+    if token is not None:
+        g.pop('query_stats', None)
+        _query_trackers.reset(token)
+
+# Rendered-page cache for anonymous visitors
+PAGE_CACHE_CSRF_PLACEHOLDER = '__monify_csrf_token__'
+_page_cache = {}
+_page_cache_lock = threading.Lock()
+page_cache_stats = {'hits': 0, 'misses': 0, 'bypassed': 0}
+
+def page_cache_hit_rate():
+    lookups = page_cache_stats['hits'] + page_cache_stats['misses']
+    return page_cache_stats['hits'] * 100 / lookups if lookups else 0
+
+def cached_page(view):
+    """Serve a GET page from memory to anonymous visitors with no pending flash messages.
+
+    Pages are stored with their CSRF token swapped for a placeholder; each hit gets a
+    fresh token for the visitor's own session, so forms on cached pages keep working.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if (request.method != 'GET' or app.config['PAGE_CACHE_TTL'] <= 0
+                or current_user.is_authenticated or session.get('_flashes')):
+            page_cache_stats['bypassed'] += 1
+            return view(*args, **kwargs)
+        
+        entry = _page_cache.get(request.path)
+        if entry and entry['expires'] > time.time():
+            page_cache_stats['hits'] += 1
+            html = entry['html']
+            if entry['csrf']:
+                html = html.replace(PAGE_CACHE_CSRF_PLACEHOLDER, generate_csrf())
+            response = make_response(html)
+            response.headers['X-Page-Cache'] = 'HIT'
+            return response
+        
+        page_cache_stats['misses'] += 1
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and response.mimetype == 'text/html':
+            html = response.get_data(as_text=True)
+            token = g.get(app.config['WTF_CSRF_FIELD_NAME'])
+            if token:
+                html = html.replace(token, PAGE_CACHE_CSRF_PLACEHOLDER)
+            with _page_cache_lock:
+                _page_cache[request.path] = {'html': html, 'csrf': bool(token),
+                                             'expires': time.time() + app.config['PAGE_CACHE_TTL']}
+            response.headers['X-Page-Cache'] = 'MISS'
+        return response
+    return wrapper
+
 @app.route('/reset-db')
 def reset_database():
     """Recreate database with new schema - USE WITH CAUTION!"""
     db.drop_all()
     db.create_all()
+    create_tenant_tables(drop=True)
     
     # Create default admin
     admin = Admin(
@@ -322,6 +2125,293 @@ def reset_database():
     return "Database reset successfully! Admin: admin@monify.ai / admin123"
 
 
+# Delta sync (offline clients pull changes since a cursor and push queued edits)
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 1000
+SYNC_MAX_MUTATIONS = 500
+SYNC_KINDS = {
+    'category': Category,
+    'expense': Expense,
+    'budget': Budget,
+    'recurring': RecurringExpense,
+}
+SYNC_KIND_OF = {model: kind for kind, model in SYNC_KINDS.items()}
+# Writable fields per type: (parser, required on create)
+SYNC_FIELDS = {
+    'category': {'name': ('name', True), 'icon': ('icon', False), 'color': ('color', False)},
+    'expense': {'description': ('description', True), 'amount': ('amount', True),
+                'date': ('date', True), 'category_id': ('category', True)},
+    'budget': {'category_id': ('category', True), 'monthly_limit': ('amount', True)},
+    'recurring': {'description': ('description', True), 'amount': ('amount', True),
+                  'category_id': ('category', True), 'frequency': ('frequency', True),
+                  'next_due_date': ('date', True), 'auto_add': ('bool', False),
+                  'is_active': ('bool', False)},
+}
+
+def record_sync_changes(user_id, model, id_select, deleted=False):
+    """Log the rows picked by id_select as changed; bulk statements bypass the flush hook"""
+    table = SyncChange.__table__
+    kind = SYNC_KIND_OF[model]
+    db.session.execute(table.delete().where(table.c.kind == kind, table.c.object_id.in_(id_select)))
+    ids = id_select.subquery()
+    db.session.execute(table.insert().from_select(
+        ['user_id', 'kind', 'object_id', 'deleted', 'changed_at'],
+        select(literal(user_id), literal(kind), list(ids.c)[0], literal(deleted), literal(datetime.utcnow()))
+    ))
+
+@event.listens_for(Session, 'after_flush')
+def log_sync_changes(session, flush_context):
+    """Record ORM inserts, updates and deletes of synced models in the change log"""
+    deleted_users = {obj.id for obj in session.deleted if isinstance(obj, User)}
+    entries = {}
+    for objects, deleted in ((session.new, False), (session.dirty, False), (session.deleted, True)):
+        for obj in objects:
+            kind = SYNC_KIND_OF.get(type(obj))
+            if kind is None or obj.user_id in deleted_users:
+                continue
+            if not deleted and not session.is_modified(obj, include_collections=False):
+                continue
+            entries[(kind, obj.id)] = (obj.user_id, deleted)
+    if not entries:
+        return
+    
+    table = SyncChange.__table__
+    now = datetime.utcnow()
+    for kind in {kind for kind, _ in entries}:
+        ids = [object_id for entry_kind, object_id in entries if entry_kind == kind]
+        session.execute(table.delete().where(table.c.kind == kind, table.c.object_id.in_(ids)))
+    session.execute(table.insert(), [
+        {'user_id': user_id, 'kind': kind, 'object_id': object_id, 'deleted': deleted, 'changed_at': now}
+        for (kind, object_id), (user_id, deleted) in entries.items()
+    ])
+
+def backfill_sync_log(user_id):
+    """Log rows written before the change log existed so a full sync sees them"""
+    table = SyncChange.__table__
+    for kind, model in SYNC_KINDS.items():
+        missing = select(
+            literal(user_id), literal(kind), model.id, literal(False), literal(datetime.utcnow())
+        ).where(model.user_id == user_id, ~select(table.c.id).where(
+            table.c.kind == kind, table.c.object_id == model.id).exists())
+        db.session.execute(table.insert().from_select(
+            ['user_id', 'kind', 'object_id', 'deleted', 'changed_at'], missing))
+    db.session.commit()
+
+def encode_sync_cursor(seq):
+    raw = json.dumps({'v': 1, 'seq': seq}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_sync_cursor(cursor):
+    """Sequence number behind an opaque cursor; raises ValueError for anything malformed"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        seq = data['seq']
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Invalid cursor')
+    if data.get('v') != 1 or not isinstance(seq, int) or seq < 0:
+        raise ValueError('Invalid cursor')
+    return seq
+
+def format_sync_timestamp(value):
+    return value.isoformat() if value else None
+
+def serialize_sync_object(kind, obj):
+    data = {'updated_at': format_sync_timestamp(obj.updated_at)}
+    if kind == 'category':
+        data.update(name=obj.name, icon=obj.icon, color=obj.color)
+    elif kind == 'budget':
+        data.update(category_id=obj.category_id, monthly_limit=obj.monthly_limit)
+    else:
+        data.update(description=obj.description, amount=obj.amount, category_id=obj.category_id)
+        if kind == 'expense':
+            data.update(date=obj.date.isoformat(), archived=obj.is_archived)
+            if obj.is_archived:
+                data['updated_at'] = format_sync_timestamp(obj.archived_at)
+        else:
+            data.update(frequency=obj.frequency, next_due_date=obj.next_due_date.isoformat(),
+                        is_active=obj.is_active, auto_add=obj.auto_add)
+    return data
+
+def load_sync_objects(user_id, kind, ids):
+    """Current rows for the ids of one type; archived expenses are served from the archive"""
+    model = SYNC_KINDS[kind]
+    objects = {obj.id: obj for obj in model.query.filter(model.user_id == user_id, model.id.in_(ids))}
+    missing = [object_id for object_id in ids if object_id not in objects]
+    if kind == 'expense' and missing:
+        objects.update((obj.id, obj) for obj in ArchivedExpense.query.filter(
+            ArchivedExpense.user_id == user_id, ArchivedExpense.id.in_(missing)))
+    return objects
+
+def parse_sync_value(parser, value, category_ids):
+    """Convert one client field; returns (value, error)"""
+    if parser in ('name', 'description'):
+        value = str(value or '').strip()
+        limit = 50 if parser == 'name' else 200
+        if not value or len(value) > limit:
+            return None, f'Must be 1-{limit} characters.'
+        return value, None
+    if parser == 'icon':
+        return (str(value)[:50] or 'fas fa-tag'), None
+    if parser == 'color':
+        value = str(value or '')
+        if len(value) != 7 or not value.startswith('#'):
+            return None, 'Must be a #rrggbb color.'
+        return value, None
+    if parser == 'amount':
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            value = 0
+        return (value, None) if value > 0 and math.isfinite(value) else (None, 'Must be a positive number.')
+    if parser == 'date':
+        try:
+            return datetime.strptime(str(value or ''), '%Y-%m-%d').date(), None
+        except ValueError:
+            return None, 'Must be YYYY-MM-DD.'
+    if parser == 'category':
+        # Categories created earlier in the same push may be referenced by client_id
+        if isinstance(value, (int, str)) and not isinstance(value, bool) and value in category_ids:
+            return category_ids[value], None
+        return None, 'Choose one of your categories.'
+    if parser == 'frequency':
+        valid = ('monthly', 'weekly', 'daily', 'yearly')
+        return (value, None) if value in valid else (None, f'Must be one of {", ".join(valid)}.')
+    if parser == 'bool':
+        return (value, None) if isinstance(value, bool) else (None, 'Must be true or false.')
+    return None, 'Unknown field.'
+
+def apply_sync_mutation(user, mutation, category_ids):
+    """Apply one pushed mutation in the open transaction; returns its result dict"""
+    kind, op = mutation.get('type'), mutation.get('op')
+    result = {'type': kind, 'id': mutation.get('id'), 'client_id': mutation.get('client_id')}
+    if kind not in SYNC_KINDS or op not in ('create', 'update', 'delete'):
+        return dict(result, status='error', errors={'op': 'Unknown type or op.'})
+    model = SYNC_KINDS[kind]
+    
+    obj = None
+    if op != 'create':
+        obj = model.query.filter_by(id=mutation.get('id'), user_id=user.id).first() \
+            if isinstance(mutation.get('id'), int) else None
+        if obj is None:
+            return dict(result, status='not_found')
+        # The client edited a copy it fetched at base_updated_at; anything newer wins
+        if mutation.get('base_updated_at') != format_sync_timestamp(obj.updated_at):
+            return dict(result, status='conflict', server=serialize_sync_object(kind, obj))
+    
+    if op == 'delete':
+        if kind == 'category':
+            if category_has_expenses(obj.id) or RecurringExpense.query.filter_by(
+                    category_id=obj.id, is_active=True).first():
+                return dict(result, status='error',
+                            errors={'id': 'Category still has expenses or active recurring expenses.'})
+            delete_category_rows(user.id, obj.id)
+            for ref in [ref for ref, category_id in category_ids.items() if category_id == obj.id]:
+                del category_ids[ref]
+        else:
+            db.session.delete(obj)
+        return dict(result, status='applied')
+    
+    data = mutation.get('data')
+    if not isinstance(data, dict):
+        return dict(result, status='error', errors={'data': 'Must be an object.'})
+    values, errors = {}, {}
+    for field, (parser, required) in SYNC_FIELDS[kind].items():
+        if field not in data:
+            if op == 'create' and required:
+                errors[field] = 'Required.'
+            continue
+        values[field], error = parse_sync_value(parser, data[field], category_ids)
+        if error:
+            errors[field] = error
+    if kind == 'budget' and 'category_id' in values and Budget.query.filter(
+            Budget.user_id == user.id, Budget.category_id == values['category_id'],
+            Budget.id != (obj.id if obj else None)).first():
+        errors['category_id'] = 'This category already has a budget.'
+    if errors:
+        return dict(result, status='error', errors=errors)
+    
+    if kind == 'recurring' and 'next_due_date' in values:
+        values['anchor_date'] = values['next_due_date']
+    if obj is None:
+        obj = model(user_id=user.id, **values)
+        db.session.add(obj)
+    else:
+        for field, value in values.items():
+            setattr(obj, field, value)
+    db.session.flush()
+    if kind == 'category' and op == 'create':
+        category_ids[obj.id] = obj.id
+        if isinstance(mutation.get('client_id'), str):
+            category_ids[mutation['client_id']] = obj.id
+    return dict(result, id=obj.id, status='applied', updated_at=format_sync_timestamp(obj.updated_at))
+
+@app.route('/api/sync', methods=['GET'])
+@login_required
+def api_sync_pull():
+    """Changes after ?cursor= (omit for a full sync), at most ?limit= per page"""
+    if isinstance(current_user, Admin):
+        return jsonify({'error': 'Not available for admins'}), 403
+    
+    cursor = request.args.get('cursor', '')
+    try:
+        seq = decode_sync_cursor(cursor) if cursor else 0
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = min(max(request.args.get('limit', SYNC_PAGE_SIZE, type=int), 1), SYNC_MAX_PAGE_SIZE)
+    if not cursor:
+        backfill_sync_log(current_user.id)
+    
+    changes = SyncChange.query.filter(
+        SyncChange.user_id == current_user.id, SyncChange.id > seq
+    ).order_by(SyncChange.id).limit(limit + 1).all()
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    
+    live = defaultdict(list)
+    for change in changes:
+        if not change.deleted:
+            live[change.kind].append(change.object_id)
+    objects = {kind: load_sync_objects(current_user.id, kind, ids) for kind, ids in live.items()}
+    
+    items = []
+    for change in changes:
+        obj = objects.get(change.kind, {}).get(change.object_id)
+        item = {'type': change.kind, 'id': change.object_id, 'deleted': obj is None}
+        if obj is not None:
+            item['data'] = serialize_sync_object(change.kind, obj)
+        items.append(item)
+    
+    next_seq = changes[-1].id if changes else seq
+    return jsonify({'changes': items, 'cursor': encode_sync_cursor(next_seq), 'has_more': has_more})
+
+@app.route('/api/sync', methods=['POST'])
+@login_required
+def api_sync_push():
+    """JSON body: {"mutations": [{type, op, id, client_id, base_updated_at, data}]}"""
+    if isinstance(current_user, Admin):
+        return jsonify({'error': 'Not available for admins'}), 403
+    
+    payload = request.get_json(silent=True) or {}
+    mutations = payload.get('mutations')
+    if not isinstance(mutations, list) or not all(isinstance(m, dict) for m in mutations):
+        return jsonify({'error': 'mutations must be a list of objects'}), 400
+    if len(mutations) > SYNC_MAX_MUTATIONS:
+        return jsonify({'error': f'At most {SYNC_MAX_MUTATIONS} mutations per push'}), 400
+    
+    category_ids = {c.id: c.id for c in get_user_categories(current_user)}
+    try:
+        results = [apply_sync_mutation(current_user, mutation, category_ids) for mutation in mutations]
+        applied = [r for r in results if r['status'] == 'applied']
+        if applied:
+            if any(r['type'] == 'category' for r in applied):
+                invalidate_user_categories(current_user.id)
+            bump_data_version(current_user)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error: {str(e)}'}), 500
+    return jsonify({'results': results})
+
 # User loader
 @login_manager.user_loader
 def load_user(user_id):
@@ -338,6 +2428,7 @@ def inject_current_year():
     return {'current_year': datetime.now().year}
 
 @app.route('/')
+@cached_page
 def home():  # Change back from 'landing' to 'home'
     # Always show landing page regardless of authentication
     return render_template('home.html')
@@ -353,6 +2444,7 @@ def dashboard():  # Keep this as dashboard
 
 
 @app.route('/register', methods=['GET', 'POST'])
+@cached_page
 def register():
     if current_user.is_authenticated and isinstance(current_user, User):
         return redirect(url_for('home'))
@@ -366,10 +2458,11 @@ def register():
         
         # Create default categories for new user
         default_categories = ['Food', 'Transportation', 'Entertainment', 'Shopping', 'Bills', 'Other']
-        for cat_name in default_categories:
-            category = Category(name=cat_name, user_id=user.id)
-            db.session.add(category)
-        db.session.commit()
+        with use_shard(shard_for(user.id)):
+            for cat_name in default_categories:
+                category = Category(name=cat_name, user_id=user.id)
+                db.session.add(category)
+            db.session.commit()
         
         flash('Registration successful! Please log in.', 'success')
         return redirect(url_for('login'))
@@ -377,6 +2470,7 @@ def register():
     return render_template('register.html', form=form)
 
 @app.route('/login', methods=['GET', 'POST'])
+@cached_page
 def login():
     if current_user.is_authenticated and isinstance(current_user, User):
         return redirect(url_for('home'))
@@ -401,6 +2495,7 @@ def logout():
     return redirect(url_for('home'))
 
 @app.route('/forgot-password', methods=['GET', 'POST'])
+@cached_page
 def forgot_password():
     if current_user.is_authenticated:
         return redirect(url_for('home'))
@@ -460,25 +2555,41 @@ def expenses():
     search = request.args.get('search', '')
     category_filter = request.args.get('category', '')
     sort_by = request.args.get('sort', 'date_desc')
-    
-    query = Expense.query.filter_by(user_id=current_user.id)
-    
-    if search:
-        query = query.filter(Expense.description.contains(search))
-    if category_filter:
-        query = query.filter_by(category_id=int(category_filter))
-    
-    if sort_by == 'date_desc':
-        query = query.order_by(Expense.date.desc(),Expense.id.desc())
-    elif sort_by == 'date_asc':
-        query = query.order_by(Expense.date.asc(),Expense.id.desc())
-    elif sort_by == 'amount_desc':
-        query = query.order_by(Expense.amount.desc(),Expense.id.desc())
-    elif sort_by == 'amount_asc':
-        query = query.order_by(Expense.amount.asc(),Expense.id.desc())
-    
-    expenses = query.all()
-    categories = Category.query.filter_by(user_id=current_user.id).all()
+    include_archived = request.args.get('include_archived') == '1'
+    
+    def filtered(model):
+        query = model.query.filter_by(user_id=current_user.id).options(selectinload(model.category))
+        if search:
+            query = query.filter(model.description.contains(search))
+        if category_filter:
+            query = query.filter_by(category_id=int(category_filter))
+        
+        if sort_by == 'date_desc':
+            query = query.order_by(model.date.desc(),model.id.desc())
+        elif sort_by == 'date_asc':
+            query = query.order_by(model.date.asc(),model.id.desc())
+        elif sort_by == 'amount_desc':
+            query = query.order_by(model.amount.desc(),model.id.desc())
+        elif sort_by == 'amount_asc':
+            query = query.order_by(model.amount.asc(),model.id.desc())
+        return query
+    
+    expenses = filtered(Expense).all()
+    categories = get_user_categories(current_user)
+    if include_archived:
+        # Both lists are already sorted; backdated live rows can be older than archived ones
+        archived = filtered(ArchivedExpense).all()
+        merge_keys = {
+            'date_desc': (lambda x: (x.date, x.id), True),
+            'date_asc': (lambda x: (x.date, -x.id), False),
+            'amount_desc': (lambda x: (x.amount, x.id), True),
+            'amount_asc': (lambda x: (x.amount, -x.id), False)
+        }
+        if sort_by in merge_keys:
+            key, reverse = merge_keys[sort_by]
+            expenses = list(heapq.merge(expenses, archived, key=key, reverse=reverse))
+        else:
+            expenses = expenses + archived
     
     # Get recurring expenses and due ones
     recurring_expenses = RecurringExpense.query.filter_by(user_id=current_user.id, is_active=True).all()
@@ -519,6 +2630,7 @@ def expenses():
                          search=search,
                          category_filter=category_filter,
                          sort_by=sort_by,
+                         include_archived=include_archived,
                          now=datetime.now())
 
 @app.route('/add-recurring-expense', methods=['POST'])
@@ -535,7 +2647,7 @@ def add_recurring_expense():
         next_due_date_str = request.form.get('next_due_date')
         auto_add = bool(request.form.get('auto_add'))
         
-        if not description or amount <= 0 or category_id == 0:
+        if not description or not (amount > 0 and math.isfinite(amount)) or category_id not in dict(category_choices(current_user)):
             flash('Please fill all required fields correctly.', 'error')
             return redirect(url_for('expenses'))
         
@@ -548,10 +2660,12 @@ def add_recurring_expense():
             user_id=current_user.id,
             frequency=frequency,
             next_due_date=next_due_date,
+            anchor_date=next_due_date,
             auto_add=auto_add
         )
         
         db.session.add(recurring_expense)
+        bump_data_version(current_user)
         db.session.commit()
         flash(f'Recurring expense "{description}" created successfully!', 'success')
         
@@ -575,18 +2689,48 @@ def process_recurring(recurring_id):
     )
     db.session.add(expense)
     
-    recurring.next_due_date = recurring.get_next_due_date()
+    recurring.advance()
     recurring.last_processed = datetime.now().date()
     
+    bump_data_version(current_user)
     db.session.commit()
     flash(f'Recurring expense "{recurring.description}" processed!', 'success')
     return redirect(url_for('expenses') + '#recurring')
 
+@app.route('/recurring/calendar')
+@login_required
+def recurring_calendar():
+    if isinstance(current_user, Admin):
+        return redirect(url_for('admin_dashboard'))
+    
+    months = min(max(request.args.get('months', 3, type=int), 1), OBLIGATIONS_MAX_MONTHS)
+    obligations = get_upcoming_obligations(current_user, months)
+    if request.args.get('format') == 'json':
+        def items_json(items):
+            return [dict(item, date=item['date'].isoformat()) for item in items]
+        return jsonify({
+            'start': obligations['start'].isoformat(),
+            'end': obligations['end'].isoformat(),
+            'total': round(obligations['total'], 2),
+            'overdue': items_json(obligations['overdue']),
+            'overdue_count': obligations['overdue_count'],
+            'overdue_total': round(obligations['overdue_total'], 2),
+            'months': [{
+                'month': month['month'],
+                'total': round(month['total'], 2),
+                'count': month['count'],
+                'days': [{'date': day['date'].isoformat(), 'items': items_json(day['items'])}
+                         for day in month['days']]
+            } for month in obligations['months']]
+        })
+    return render_template('recurring_calendar.html', obligations=obligations, months=months)
+
 @app.route('/delete-recurring/<int:recurring_id>', methods=['POST'])
 @login_required
 def delete_recurring(recurring_id):
     recurring = RecurringExpense.query.filter_by(id=recurring_id, user_id=current_user.id).first_or_404()
     recurring.is_active = False
+    bump_data_version(current_user)
     db.session.commit()
     flash(f'Recurring expense deleted!', 'success')
     return redirect(url_for('expenses') + '#recurring')
@@ -601,7 +2745,7 @@ def add_expense():
         return redirect(url_for('admin_dashboard'))
     
     form = ExpenseForm()
-    form.category.choices = [(c.id, c.name) for c in Category.query.filter_by(user_id=current_user.id).all()]
+    form.category.choices = category_choices(current_user)
     
     if not form.category.choices:
         flash('Please add at least one category before adding expenses.', 'warning')
@@ -616,12 +2760,175 @@ def add_expense():
             category_id=form.category.data
         )
         db.session.add(expense)
+        changes = [(expense.category_id, expense.date, expense.amount, expense.description, 1)]
+        previous_version = bump_data_version(current_user)
         db.session.commit()
+        apply_expense_changes(current_user, previous_version, changes)
         flash('Expense added successfully!', 'success')
         return redirect(url_for('expenses'))
     
     return render_template('add_expense.html', form=form)
 
+@app.route('/expenses/autocomplete')
+@login_required
+def expense_autocomplete():
+    if isinstance(current_user, Admin):
+        return jsonify({'error': 'Not available for admins'}), 403
+    
+    prefix = request.args.get('q', '')
+    if not prefix.strip():
+        return jsonify({'suggestions': []})
+    categories = {c.id: c.name for c in get_user_categories(current_user)}
+    suggestions = get_description_index(current_user).suggest(prefix, datetime.now().date())
+    return jsonify({'suggestions': [{
+        'description': entry['description'],
+        'category_id': entry['category_id'] if entry['category_id'] in categories else None,
+        'category': categories.get(entry['category_id']),
+        'amount': round(entry['amount'], 2),
+        'count': entry['count'],
+        'last_used': entry['last_used'].isoformat()
+    } for entry in suggestions]})
+
+# Batch expense entry
+BATCH_MAX_ROWS = 500
+
+def validate_expense_rows(rows, user):
+    """Check every row against the user's categories in one pass.
+
+    Returns (valid, errors): valid holds (row number, Expense column values) and errors
+    holds {'row', 'errors'} dicts keyed by field name.
+    """
+    category_ids = {c.id for c in get_user_categories(user)}
+    valid, errors = [], []
+    for number, row in enumerate(rows, 1):
+        row_errors = {}
+        description = str(row.get('description') or '').strip()
+        if not description:
+            row_errors['description'] = 'Description is required.'
+        elif len(description) > 200:
+            row_errors['description'] = 'Description must be at most 200 characters.'
+        
+        try:
+            amount = float(row.get('amount'))
+            if not (amount > 0 and math.isfinite(amount)):
+                raise ValueError
+        except (TypeError, ValueError):
+            row_errors['amount'] = 'Amount must be a positive number.'
+        
+        try:
+            date = datetime.strptime(str(row.get('date') or ''), '%Y-%m-%d').date()
+        except ValueError:
+            row_errors['date'] = 'Date must be YYYY-MM-DD.'
+        
+        try:
+            category_id = int(row.get('category_id') or row.get('category'))
+            if category_id not in category_ids:
+                raise ValueError
+        except (TypeError, ValueError):
+            row_errors['category'] = 'Choose one of your categories.'
+        
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+        else:
+            valid.append((number, {
+                'description': description,
+                'amount': amount,
+                'date': date,
+                'user_id': user.id,
+                'category_id': category_id
+            }))
+    return valid, errors
+
+def insert_expense_rows(user, valid):
+    """Insert validated rows in a single transaction with one executemany"""
+    values = [row for _, row in valid]
+    ids = db.session.scalars(Expense.__table__.insert().returning(Expense.id), values).all()
+    record_sync_changes(user.id, Expense, select(Expense.id).where(Expense.id.in_(ids)))
+    record_expense_changes(db.session, user.id, [(row['category_id'], row['date'], row['amount'], 1) for row in values])
+    previous_version = bump_data_version(user)
+    db.session.commit()
+    apply_expense_changes(user, previous_version, [
+        (row['category_id'], row['date'], row['amount'], row['description'], 1) for row in values
+    ])
+    return len(values)
+
+def save_expense_batch(user, rows, partial=False):
+    """Validate and insert a batch. All-or-nothing unless partial is set, in which case the
+    valid rows are saved and the invalid ones reported."""
+    if len(rows) > BATCH_MAX_ROWS:
+        return 0, [{'row': None, 'errors': {'rows': f'At most {BATCH_MAX_ROWS} expenses per batch.'}}]
+    
+    valid, errors = validate_expense_rows(rows, user)
+    if (errors and not partial) or not valid:
+        return 0, errors
+    return insert_expense_rows(user, valid), errors
+
+@app.route('/add_expenses', methods=['GET', 'POST'])
+@login_required
+def add_expenses():
+    if isinstance(current_user, Admin):
+        return redirect(url_for('admin_dashboard'))
+    
+    categories = get_user_categories(current_user)
+    if not categories:
+        flash('Please add at least one category before adding expenses.', 'warning')
+        return redirect(url_for('add_category'))
+    
+    rows, errors = [], []
+    if request.method == 'POST':
+        fields = ['description', 'amount', 'date', 'category']
+        columns = [request.form.getlist(f'{field}[]') for field in fields]
+        rows = [dict(zip(fields, values)) for values in zip(*columns)]
+        # Rows left completely blank in the form are ignored
+        rows = [row for row in rows if row['description'].strip() or row['amount'].strip()]
+        
+        partial = request.form.get('mode') == 'partial'
+        created, errors = save_expense_batch(current_user, rows, partial)
+        if created and not errors:
+            flash(f'{created} expenses added successfully!', 'success')
+            return redirect(url_for('expenses'))
+        if created:
+            flash(f'{created} expenses added. Fix the rows below and submit them again.', 'warning')
+            failed = {error['row'] for error in errors}
+            rows = [row for number, row in enumerate(rows, 1) if number in failed]
+            errors = [dict(error, row=i) for i, error in enumerate(errors, 1)]
+        elif rows:
+            flash('No expenses were saved. Fix the highlighted rows and try again.', 'danger')
+        else:
+            flash('Please fill in at least one expense.', 'warning')
+    
+    return render_template('add_expenses.html',
+                         categories=categories,
+                         rows=rows,
+                         errors={error['row']: error['errors'] for error in errors},
+                         batch_max_rows=BATCH_MAX_ROWS,
+                         today=datetime.now().strftime('%Y-%m-%d'))
+
+@app.route('/api/csrf-token', methods=['GET'])
+@login_required
+def api_csrf_token():
+    """Token for JSON clients to send back in the X-CSRFToken header on POST requests"""
+    return jsonify({'csrf_token': generate_csrf()})
+
+@app.route('/api/expenses/batch', methods=['POST'])
+@login_required
+def api_expenses_batch():
+    """JSON body: {"mode": "all_or_nothing" | "partial", "expenses": [{description, amount, date, category_id}]}"""
+    if isinstance(current_user, Admin):
+        return jsonify({'error': 'Not available for admins'}), 403
+    
+    payload = request.get_json(silent=True) or {}
+    rows = payload.get('expenses')
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        return jsonify({'error': 'expenses must be a list of objects'}), 400
+    mode = payload.get('mode', 'all_or_nothing')
+    if mode not in ('all_or_nothing', 'partial'):
+        return jsonify({'error': 'mode must be all_or_nothing or partial'}), 400
+    
+    created, errors = save_expense_batch(current_user, rows, partial=mode == 'partial')
+    status = 201 if created else (422 if errors else 400)
+    return jsonify({'created': created, 'errors': errors}), status
+
 @app.route('/edit_expense/<int:expense_id>', methods=['GET', 'POST'])
 @login_required
 def edit_expense(expense_id):
@@ -630,14 +2937,18 @@ def edit_expense(expense_id):
     
     expense = Expense.query.filter_by(id=expense_id, user_id=current_user.id).first_or_404()
     form = ExpenseForm()
-    form.category.choices = [(c.id, c.name) for c in Category.query.filter_by(user_id=current_user.id).all()]
+    form.category.choices = category_choices(current_user)
     
     if form.validate_on_submit():
+        changes = [(expense.category_id, expense.date, expense.amount, expense.description, -1)]
         expense.description = form.description.data
         expense.amount = form.amount.data
         expense.date = datetime.strptime(form.date.data, '%Y-%m-%d').date()
         expense.category_id = form.category.data
+        changes.append((expense.category_id, expense.date, expense.amount, expense.description, 1))
+        previous_version = bump_data_version(current_user)
         db.session.commit()
+        apply_expense_changes(current_user, previous_version, changes)
         flash('Expense updated successfully!', 'success')
         return redirect(url_for('expenses'))
     
@@ -656,8 +2967,11 @@ def delete_expense(expense_id):
         return redirect(url_for('admin_dashboard'))
     
     expense = Expense.query.filter_by(id=expense_id, user_id=current_user.id).first_or_404()
+    changes = [(expense.category_id, expense.date, expense.amount, expense.description, -1)]
     db.session.delete(expense)
+    previous_version = bump_data_version(current_user)
     db.session.commit()
+    apply_expense_changes(current_user, previous_version, changes)
     flash('Expense deleted successfully!', 'success')
     return redirect(url_for('expenses'))
 
@@ -668,10 +2982,10 @@ def add_category():
         return redirect(url_for('admin_dashboard'))
     
     form = CategoryForm()
-    categories = Category.query.filter_by(user_id=current_user.id).all()
+    categories = get_user_categories(current_user)
     
     if form.validate_on_submit():
-        existing = Category.query.filter_by(name=form.name.data, user_id=current_user.id).first()
+        existing = any(c.name == form.name.data for c in categories)
         if existing:
             flash('Category already exists!', 'warning')
         else:
@@ -682,11 +2996,137 @@ def add_category():
                 color=form.color.data
             )
             db.session.add(category)
+            invalidate_user_categories(current_user.id)
             db.session.commit()
             flash('Category added successfully!', 'success')
             return redirect(url_for('add_category'))
     
-    return render_template('add_category.html', form=form, categories=categories)
+    # Expense counts per category in one grouped query instead of loading category.expenses
+    expense_counts = dict(db.session.query(
+        Expense.category_id,
+        func.count(Expense.id)
+    ).filter(Expense.user_id == current_user.id).group_by(Expense.category_id).all())
+    for category_id, (total, count) in archived_category_totals(current_user.id).items():
+        expense_counts[category_id] = expense_counts.get(category_id, 0) + count
+    
+    return render_template('add_category.html', form=form, categories=categories,
+                         expense_counts=expense_counts)
+
+def category_has_expenses(category_id):
+    """Check for live or archived expenses with EXISTS queries instead of loading them"""
+    return db.session.query(
+        Expense.query.filter_by(category_id=category_id).exists()
+    ).scalar() or db.session.query(
+        ArchivedExpense.query.filter_by(category_id=category_id).exists()
+    ).scalar()
+
+def reassign_category_rows(user_id, source_id, target_id):
+    """Move every expense and recurring expense of a category with set-based UPDATEs"""
+    now = datetime.utcnow()
+    for model in (Expense, RecurringExpense):
+        record_sync_changes(user_id, model, select(model.id).where(
+            model.user_id == user_id, model.category_id == source_id))
+    moved_expenses = Expense.query.filter_by(
+        user_id=user_id, category_id=source_id
+    ).update({Expense.category_id: target_id, Expense.updated_at: now}, synchronize_session=False)
+    moved_recurring = RecurringExpense.query.filter_by(
+        user_id=user_id, category_id=source_id
+    ).update({RecurringExpense.category_id: target_id, RecurringExpense.updated_at: now}, synchronize_session=False)
+    for model in (ArchivedExpense, ArchiveRollup):
+        model.query.filter_by(user_id=user_id, category_id=source_id).update(
+            {model.category_id: target_id}, synchronize_session=False)
+    reset_budget_spend(user_id, [source_id, target_id])
+    rebuild_amount_sketches(user_id, [source_id, target_id])
+    return moved_expenses, moved_recurring
+
+def get_target_category(source):
+    """Look up the target category posted with a merge/reassign form"""
+    target_id = request.form.get('target_category', 0, type=int)
+    if not target_id or target_id == source.id:
+        return None
+    return Category.query.filter_by(id=target_id, user_id=current_user.id).first()
+
+@app.route('/reassign_category/<int:category_id>', methods=['POST'])
+@login_required
+def reassign_category(category_id):
+    if isinstance(current_user, Admin):
+        return redirect(url_for('admin_dashboard'))
+    
+    source = Category.query.filter_by(id=category_id, user_id=current_user.id).first_or_404()
+    target = get_target_category(source)
+    if not target:
+        flash('Please choose a different category to move expenses to.', 'warning')
+        return redirect(url_for('add_category'))
+    
+    try:
+        moved_expenses, moved_recurring = reassign_category_rows(current_user.id, source.id, target.id)
+        bump_data_version(current_user)
+        db.session.commit()
+        flash(f'Moved {moved_expenses} expenses and {moved_recurring} recurring expenses '
+              f'from "{source.name}" to "{target.name}".', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error: {str(e)}', 'error')
+    
+    return redirect(url_for('add_category'))
+
+@app.route('/merge_category/<int:category_id>', methods=['POST'])
+@login_required
+def merge_category(category_id):
+    if isinstance(current_user, Admin):
+        return redirect(url_for('admin_dashboard'))
+    
+    source = Category.query.filter_by(id=category_id, user_id=current_user.id).first_or_404()
+    target = get_target_category(source)
+    if not target:
+        flash('Please choose a different category to merge into.', 'warning')
+        return redirect(url_for('add_category'))
+    
+    source_name = source.name
+    try:
+        moved_expenses, moved_recurring = reassign_category_rows(current_user.id, source.id, target.id)
+        
+        # Keep the target's budget if it has one, otherwise carry the source budget over
+        target_has_budget = db.session.query(
+            Budget.query.filter_by(user_id=current_user.id, category_id=target.id).exists()
+        ).scalar()
+        source_budgets = Budget.query.filter_by(user_id=current_user.id, category_id=source.id)
+        record_sync_changes(current_user.id, Budget, select(Budget.id).where(
+            Budget.user_id == current_user.id, Budget.category_id == source.id), deleted=target_has_budget)
+        if target_has_budget:
+            source_budgets.delete(synchronize_session=False)
+        else:
+            source_budgets.update({Budget.category_id: target.id, Budget.updated_at: datetime.utcnow()},
+                                  synchronize_session=False)
+        
+        record_sync_changes(current_user.id, Category, select(Category.id).where(Category.id == source.id), deleted=True)
+        Category.query.filter_by(id=source.id, user_id=current_user.id).delete(synchronize_session=False)
+        BudgetAlert.query.filter_by(category_id=source.id).delete(synchronize_session=False)
+        refresh_pending_alerts(db.session, current_user.id)
+        invalidate_user_categories(current_user.id)
+        bump_data_version(current_user)
+        db.session.commit()
+        db.session.expire_all()
+        flash(f'Merged "{source_name}" into "{target.name}" '
+              f'({moved_expenses} expenses, {moved_recurring} recurring expenses moved).', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error: {str(e)}', 'error')
+    
+    return redirect(url_for('add_category'))
+
+def delete_category_rows(user_id, category_id):
+    """Delete an empty category with its budgets and deactivated recurring expenses,
+    which have no meaning without it"""
+    sketches = amount_sketch_parts(db.session, AmountSketch.category_id == category_id, weight=-1)
+    for model in (Budget, RecurringExpense, Category):
+        column = model.id if model is Category else model.category_id
+        record_sync_changes(user_id, model, select(model.id).where(column == category_id), deleted=True)
+        model.query.filter(column == category_id).delete(synchronize_session=False)
+    for model in (ArchiveRollup, CategoryMonthTotal, BudgetAlert, AmountSketch):
+        model.query.filter_by(category_id=category_id).delete(synchronize_session=False)
+    apply_category_sketches(db.session, sketches)
+    refresh_pending_alerts(db.session, user_id)
 
 @app.route('/delete_category/<int:category_id>', methods=['POST'])
 @login_required
@@ -697,12 +3137,22 @@ def delete_category(category_id):
     category = Category.query.filter_by(id=category_id, user_id=current_user.id).first_or_404()
     
     # Check if category has expenses
-    if category.expenses:
-        flash(f'Cannot delete category "{category.name}" because it has {len(category.expenses)} expenses.', 'warning')
+    if category_has_expenses(category.id):
+        expense_count = Expense.query.filter_by(category_id=category.id).count() + \
+            ArchivedExpense.query.filter_by(category_id=category.id).count()
+        flash(f'Cannot delete category "{category.name}" because it has {expense_count} expenses. '
+              f'Merge or reassign them first.', 'warning')
+    elif RecurringExpense.query.filter_by(category_id=category.id, is_active=True).count():
+        flash(f'Cannot delete category "{category.name}" because it has active recurring expenses. '
+              f'Merge or reassign them first.', 'warning')
     else:
-        db.session.delete(category)
+        category_name = category.name
+        delete_category_rows(current_user.id, category.id)
+        invalidate_user_categories(current_user.id)
+        bump_data_version(current_user)
         db.session.commit()
-        flash(f'Category "{category.name}" deleted successfully!', 'success')
+        db.session.expire_all()
+        flash(f'Category "{category_name}" deleted successfully!', 'success')
     
     return redirect(url_for('add_category'))
 
@@ -713,20 +3163,16 @@ def budgets():
     if isinstance(current_user, Admin):
         return redirect(url_for('admin_dashboard'))
     
-    budgets = Budget.query.filter_by(user_id=current_user.id).all()
+    budgets = Budget.query.filter_by(user_id=current_user.id).options(selectinload(Budget.category)).all()
     
-    # Calculate current month spending for each budget
-    current_month = datetime.now().month
-    current_year = datetime.now().year
+    # Current month spending and month-end projection for each budget
+    forecast = get_budget_forecast(current_user)
     
     budget_data = []
     for budget in budgets:
-        spent_this_month = db.session.query(func.sum(Expense.amount)).filter(
-            Expense.user_id == current_user.id,
-            Expense.category_id == budget.category_id,
-            func.extract('month', Expense.date) == current_month,
-            func.extract('year', Expense.date) == current_year
-        ).scalar() or 0
+        category_forecast = forecast.get(budget.category_id, {})
+        spent_this_month = category_forecast.get('spent', 0)
+        projected = category_forecast.get('projected', spent_this_month)
         
         percentage = (spent_this_month / budget.monthly_limit) * 100 if budget.monthly_limit > 0 else 0
         
@@ -734,7 +3180,10 @@ def budgets():
             'budget': budget,
             'spent': spent_this_month,
             'remaining': budget.monthly_limit - spent_this_month,
-            'percentage': percentage
+            'percentage': percentage,
+            'projected': projected,
+            'projected_percentage': (projected / budget.monthly_limit) * 100 if budget.monthly_limit > 0 else 0,
+            'recurring_due': category_forecast.get('recurring_due', 0)
         })
     
     return render_template('budgets.html', budget_data=budget_data)
@@ -746,7 +3195,7 @@ def add_budget():
         return redirect(url_for('admin_dashboard'))
     
     form = BudgetForm()
-    form.category.choices = [(c.id, c.name) for c in Category.query.filter_by(user_id=current_user.id).all()]
+    form.category.choices = category_choices(current_user)
     
     if form.validate_on_submit():
         existing_budget = Budget.query.filter_by(
@@ -766,6 +3215,7 @@ def add_budget():
             db.session.add(budget)
             flash('Budget set successfully!', 'success')
         
+        bump_data_version(current_user)
         db.session.commit()
         return redirect(url_for('budgets'))
     
@@ -779,24 +3229,47 @@ def delete_budget(budget_id):
     
     budget = Budget.query.filter_by(id=budget_id, user_id=current_user.id).first_or_404()
     db.session.delete(budget)
+    bump_data_version(current_user)
     db.session.commit()
     flash('Budget deleted successfully!', 'success')
     return redirect(url_for('budgets'))
 
+@app.route('/alerts')
+@login_required
+def budget_alerts():
+    if isinstance(current_user, Admin):
+        return redirect(url_for('admin_dashboard'))
+    
+    alerts = BudgetAlert.query.filter_by(user_id=current_user.id).order_by(BudgetAlert.created_at.desc()).limit(100).all()
+    unseen = {alert.id for alert in alerts if not alert.seen}
+    if current_user.pending_alerts or unseen:
+        mark_budget_alerts_seen(current_user)
+    categories = {c.id: c for c in get_user_categories(current_user)}
+    return render_template('alerts.html', alerts=alerts, unseen=unseen, categories=categories)
+
+@app.route('/alerts/seen', methods=['POST'])
+@login_required
+def budget_alerts_seen():
+    if isinstance(current_user, Admin):
+        return redirect(url_for('admin_dashboard'))
+    
+    mark_budget_alerts_seen(current_user)
+    return redirect(request.referrer or url_for('budgets'))
+
 @app.route('/summary')
 @login_required
 def summary():
     if isinstance(current_user, Admin):
         return redirect(url_for('admin_dashboard'))
     
-    categories = Category.query.filter_by(user_id=current_user.id).all()
+    category_names = {c.id: c.name for c in get_user_categories(current_user)}
     expenses = Expense.query.filter_by(user_id=current_user.id).all()
     
     # Calculate totals by category
     category_totals = {}
     category_counts = {}
     for expense in expenses:
-        category_name = expense.category.name
+        category_name = category_names.get(expense.category_id, 'Other')
         if category_name in category_totals:
             category_totals[category_name] += expense.amount
             category_counts[category_name] += 1
@@ -805,29 +3278,69 @@ def summary():
             category_counts[category_name] = 1
     
     total_amount = sum(expense.amount for expense in expenses)
+    expense_count = len(expenses)
+    
+    # Archived expenses count through their monthly rollups
+    for category_id, (total, count) in archived_category_totals(current_user.id).items():
+        category_name = category_names.get(category_id)
+        if category_name is None:
+            continue
+        category_totals[category_name] = category_totals.get(category_name, 0) + total
+        category_counts[category_name] = category_counts.get(category_name, 0) + count
+        total_amount += total
+        expense_count += count
     
     # Prepare data for templates
     summary_data = {
         'category_totals': category_totals,
         'category_counts': category_counts,
         'total_amount': float(total_amount),
-        'expense_count': len(expenses)
+        'expense_count': expense_count
     }
     
     return render_template('summary.html', 
                          category_totals=category_totals, 
                          total_amount=total_amount,
-                         expense_count=len(expenses),
+                         expense_count=expense_count,
                          summary_data=summary_data)
 
 
+@app.route('/summary/series')
+@login_required
+def summary_series():
+    if isinstance(current_user, Admin):
+        return jsonify({'error': 'Not available for admins'}), 403
+    
+    granularity = request.args.get('granularity', 'monthly')
+    if granularity not in SERIES_PERIODS:
+        return jsonify({'error': 'granularity must be daily, weekly or monthly'}), 400
+    
+    today = datetime.now().date()
+    try:
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else today
+        if request.args.get('start'):
+            start = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+        else:
+            # Default to the last six months
+            month = end.month - 5
+            start = datetime(end.year + (month - 1) // 12, (month - 1) % 12 + 1, 1).date()
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD dates'}), 400
+    
+    if start > end:
+        return jsonify({'error': 'start must not be after end'}), 400
+    if len(series_period_labels(granularity, start, end)) > SERIES_MAX_PERIODS:
+        return jsonify({'error': f'Range too long for {granularity} series'}), 400
+    
+    return jsonify(get_spending_series(current_user, granularity, start, end))
+
 @app.route('/export_csv')
 @login_required
 def export_csv():
     if isinstance(current_user, Admin):
         return redirect(url_for('admin_dashboard'))
     
-    expenses = Expense.query.filter_by(user_id=current_user.id).order_by(Expense.date.desc()).all()
+    include_archived = request.args.get('include_archived') == '1'
     
     output = StringIO()
     writer = csv.writer(output)
@@ -836,12 +3349,12 @@ def export_csv():
     writer.writerow(['Date', 'Description', 'Amount', 'Category'])
     
     # Write data
-    for expense in expenses:
+    for date, description, amount, category_name in expense_history_rows(current_user.id, include_archived):
         writer.writerow([
-            expense.date.strftime('%Y-%m-%d'),
-            expense.description,
-            expense.amount,
-            expense.category.name
+            date.strftime('%Y-%m-%d'),
+            description,
+            amount,
+            category_name
         ])
     
     output.seek(0)
@@ -852,6 +3365,378 @@ def export_csv():
     
     return response
 
+@job_handler('export_csv')
+def run_export_job(job):
+    """Write all of a user's expenses, archived ones included, to CSV in batches so memory stays flat"""
+    total = (Expense.query.filter_by(user_id=job.user_id).count() +
+             ArchivedExpense.query.filter_by(user_id=job.user_id).count()) or 1
+    
+    job.result_name = f'monify_expenses_{datetime.now().strftime("%Y%m%d")}.csv'
+    job.result_path = os.path.join(app.config['JOB_DIR'], f'job_{job.id}.csv')
+    db.session.commit()
+    
+    with open(job.result_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Date', 'Description', 'Amount', 'Category'])
+        rows = expense_history_rows(job.user_id, include_archived=True)
+        for i, (date, description, amount, category_name) in enumerate(rows, 1):
+            writer.writerow([date.strftime('%Y-%m-%d'), description, amount, category_name])
+            if i % 1000 == 0:
+                update_job_progress(job, i * 100 / total)
+
+@job_handler('yearly_report')
+def run_yearly_report_job(job, year):
+    """Monthly totals per category for one year, plus row and column totals"""
+    year = int(year)
+    rows = db.session.query(
+        func.strftime('%m', Expense.date).label('month'),
+        Category.name,
+        func.sum(Expense.amount),
+        func.count(Expense.id)
+    ).join(Category, Expense.category_id == Category.id).filter(
+        Expense.user_id == job.user_id,
+        Expense.date >= datetime(year, 1, 1).date(),
+        Expense.date <= datetime(year, 12, 31).date()
+    ).group_by('month', Category.name).all()
+    update_job_progress(job, 50)
+    
+    months = [datetime(year, m, 1).strftime('%b') for m in range(1, 13)]
+    table = {}
+    for month, category_name, total, count in rows:
+        table.setdefault(category_name, [0.0] * 12)[int(month) - 1] = total or 0
+    
+    job.result_name = f'monify_report_{year}.csv'
+    job.result_path = os.path.join(app.config['JOB_DIR'], f'job_{job.id}.csv')
+    db.session.commit()
+    
+    with open(job.result_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Category'] + months + ['Total'])
+        for category_name in sorted(table):
+            totals = table[category_name]
+            writer.writerow([category_name] + [round(t, 2) for t in totals] + [round(sum(totals), 2)])
+        month_totals = [sum(table[c][m] for c in table) for m in range(12)]
+        writer.writerow(['Total'] + [round(t, 2) for t in month_totals] + [round(sum(month_totals), 2)])
+
+# Account backup and restore (gzip-compressed NDJSON, one record per line)
+BACKUP_FORMAT = 'monify-backup'
+BACKUP_VERSION = 1
+BACKUP_BATCH_SIZE = 1000
+BACKUP_MAX_UPLOAD = 200 * 1024 * 1024
+
+def backup_records(user_id):
+    """Yield backup records in restore order. Expenses, archived ones included, are streamed
+    in batches rather than loaded at once."""
+    yield {'type': 'header', 'format': BACKUP_FORMAT, 'version': BACKUP_VERSION,
+           'created_at': datetime.utcnow().isoformat()}
+    counts = defaultdict(int)
+    for category in Category.query.filter_by(user_id=user_id).order_by(Category.id):
+        counts['category'] += 1
+        yield {'type': 'category', 'id': category.id, 'name': category.name,
+               'icon': category.icon, 'color': category.color}
+    for budget in Budget.query.filter_by(user_id=user_id).order_by(Budget.id):
+        counts['budget'] += 1
+        yield {'type': 'budget', 'category_id': budget.category_id, 'monthly_limit': budget.monthly_limit}
+    for recurring in RecurringExpense.query.filter_by(user_id=user_id).order_by(RecurringExpense.id):
+        counts['recurring'] += 1
+        yield {'type': 'recurring', 'category_id': recurring.category_id,
+               'description': recurring.description, 'amount': recurring.amount,
+               'frequency': recurring.frequency, 'next_due_date': recurring.next_due_date.isoformat(),
+               'anchor_date': recurring.schedule_anchor.isoformat(), 'auto_add': bool(recurring.auto_add),
+               'is_active': bool(recurring.is_active),
+               'last_processed': recurring.last_processed.isoformat() if recurring.last_processed else None}
+    
+    def rows_for(model):
+        return select(model.category_id, model.description, model.amount, model.date, model.id).where(
+            model.user_id == user_id)
+    query = union_all(rows_for(Expense), rows_for(ArchivedExpense)).subquery()
+    rows = db.session.execute(
+        select(query.c.category_id, query.c.description, query.c.amount, query.c.date)
+        .order_by(query.c.date, query.c.id)
+        .execution_options(yield_per=BACKUP_BATCH_SIZE)
+    )
+    for category_id, description, amount, date in rows:
+        counts['expense'] += 1
+        yield {'type': 'expense', 'category_id': category_id, 'description': description,
+               'amount': amount, 'date': date.isoformat()}
+    yield {'type': 'end', 'counts': dict(counts)}
+
+def read_backup_field(record, field, kind, line, required=True):
+    """Validate one field of a backup record; raises ValueError naming the line"""
+    value = record.get(field)
+    if value is None and not required:
+        return None
+    try:
+        if kind == 'text':
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError
+            return value.strip()
+        if kind == 'amount':
+            amount = float(value)
+            if isinstance(value, bool) or not (amount > 0 and math.isfinite(amount)):
+                raise ValueError
+            return amount
+        if kind == 'date':
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        if kind == 'bool':
+            if not isinstance(value, bool):
+                raise ValueError
+            return value
+    except (TypeError, ValueError):
+        pass
+    raise ValueError(f'Line {line}: invalid {field}')
+
+def restore_backup(user, lines):
+    """Add a backup's records to the user's account inside the current transaction.
+
+    Categories are matched to the user's existing ones by name, so restoring into a new
+    account doesn't duplicate the defaults. Record ids in the file are remapped to the new
+    rows; expenses go in with batched INSERTs. Returns the number of records restored per type.
+    """
+    try:
+        header = json.loads(next(lines, '') or 'null')
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get('format') != BACKUP_FORMAT:
+        raise ValueError('Not a Monify backup file')
+    if not isinstance(header.get('version'), int) or header['version'] > BACKUP_VERSION:
+        raise ValueError(f'Unsupported backup version {header.get("version")}')
+    
+    category_ids = {}
+    existing = {name.lower(): category_id for category_id, name in
+                db.session.query(Category.id, Category.name).filter_by(user_id=user.id)}
+    budgeted = {category_id for category_id, in db.session.query(Budget.category_id).filter_by(user_id=user.id)}
+    counts = defaultdict(int)
+    seen = defaultdict(int)
+    expenses = []
+    footer = None
+    
+    def flush_expenses():
+        ids = db.session.scalars(Expense.__table__.insert().returning(Expense.id), expenses).all()
+        record_sync_changes(user.id, Expense, select(Expense.id).where(Expense.id.in_(ids)))
+        record_expense_changes(db.session, user.id, [(row['category_id'], row['date'], row['amount'], 1)
+                                                      for row in expenses])
+        counts['expense'] += len(expenses)
+        expenses.clear()
+    
+    def category_for(record, line):
+        if record.get('category_id') not in category_ids:
+            raise ValueError(f'Line {line}: unknown category_id')
+        return category_ids[record['category_id']]
+    
+    for line, text in enumerate(lines, 2):
+        if footer is not None:
+            raise ValueError(f'Line {line}: data after the end record')
+        try:
+            record = json.loads(text)
+            kind = record['type']
+        except (ValueError, TypeError, KeyError):
+            raise ValueError(f'Line {line}: not a backup record')
+        
+        if kind == 'end':
+            footer = record
+            continue
+        seen[kind] += 1
+        if kind == 'category':
+            name = read_backup_field(record, 'name', 'text', line)[:50]
+            category_id = existing.get(name.lower())
+            if category_id is None:
+                category = Category(name=name, user_id=user.id,
+                                    icon=str(record.get('icon') or 'fas fa-tag')[:50],
+                                    color=str(record.get('color') or '#667eea')[:7])
+                db.session.add(category)
+                db.session.flush()
+                category_id = existing[name.lower()] = category.id
+                counts['category'] += 1
+            category_ids[record.get('id')] = category_id
+        elif kind == 'budget':
+            category_id = category_for(record, line)
+            monthly_limit = read_backup_field(record, 'monthly_limit', 'amount', line)
+            if category_id not in budgeted:
+                db.session.add(Budget(category_id=category_id, monthly_limit=monthly_limit, user_id=user.id))
+                budgeted.add(category_id)
+                counts['budget'] += 1
+        elif kind == 'recurring':
+            frequency = record.get('frequency')
+            if frequency not in RECURRENCE_DAYS and frequency not in RECURRENCE_MONTHS:
+                raise ValueError(f'Line {line}: invalid frequency')
+            db.session.add(RecurringExpense(
+                category_id=category_for(record, line),
+                user_id=user.id,
+                description=read_backup_field(record, 'description', 'text', line)[:200],
+                amount=read_backup_field(record, 'amount', 'amount', line),
+                frequency=frequency,
+                next_due_date=read_backup_field(record, 'next_due_date', 'date', line),
+                anchor_date=read_backup_field(record, 'anchor_date', 'date', line, required=False),
+                auto_add=read_backup_field(record, 'auto_add', 'bool', line, required=False) or False,
+                is_active=read_backup_field(record, 'is_active', 'bool', line, required=False) is not False,
+                last_processed=read_backup_field(record, 'last_processed', 'date', line, required=False)
+            ))
+            counts['recurring'] += 1
+        elif kind == 'expense':
+            expenses.append({
+                'category_id': category_for(record, line),
+                'user_id': user.id,
+                'description': read_backup_field(record, 'description', 'text', line)[:200],
+                'amount': read_backup_field(record, 'amount', 'amount', line),
+                'date': read_backup_field(record, 'date', 'date', line)
+            })
+            if len(expenses) >= BACKUP_BATCH_SIZE:
+                flush_expenses()
+        else:
+            raise ValueError(f'Line {line}: unknown record type "{kind}"')
+    
+    # A missing or mismatched end record means the file was cut short
+    if footer is None or footer.get('counts') != {kind: n for kind, n in seen.items()}:
+        raise ValueError('Backup file is incomplete')
+    if expenses:
+        flush_expenses()
+    if counts['category']:
+        invalidate_user_categories(user.id)
+    bump_data_version(user)
+    return dict(counts)
+
+@job_handler('backup')
+def run_backup_job(job):
+    """Stream the user's whole account to a gzip-compressed NDJSON file"""
+    total = (Expense.query.filter_by(user_id=job.user_id).count() +
+             ArchivedExpense.query.filter_by(user_id=job.user_id).count()) or 1
+    
+    job.result_name = f'monify_backup_{datetime.now().strftime("%Y%m%d")}.ndjson.gz'
+    job.result_path = os.path.join(app.config['JOB_DIR'], f'job_{job.id}.ndjson.gz')
+    db.session.commit()
+    
+    with gzip.open(job.result_path, 'wt', encoding='utf-8') as f:
+        for i, record in enumerate(backup_records(job.user_id), 1):
+            f.write(json.dumps(record, separators=(',', ':')) + '\n')
+            if i % 10000 == 0:
+                update_job_progress(job, i * 100 / total)
+
+@job_handler('restore')
+def run_restore_job(job):
+    """Restore an uploaded backup in one transaction; nothing is kept if any record is invalid"""
+    update_job_progress(job, 10)
+    user = db.session.get(User, job.user_id)
+    with gzip.open(job.result_path, 'rt', encoding='utf-8') as f:
+        counts = restore_backup(user, (line for line in f if line.strip()))
+    db.session.commit()
+    app.logger.info('Restored backup for user %s: %s', job.user_id, counts)
+    remove_job_file(job)
+
+@app.route('/jobs')
+@login_required
+def jobs():
+    if isinstance(current_user, Admin):
+        return redirect(url_for('admin_dashboard'))
+    
+    user_jobs = Job.query.filter_by(user_id=current_user.id).order_by(Job.id.desc()).limit(50).all()
+    if request.args.get('format') == 'json':
+        return jsonify([job.to_dict() for job in user_jobs])
+    return render_template('jobs.html', jobs=user_jobs)
+
+@app.route('/jobs/export', methods=['POST'])
+@login_required
+def job_export():
+    if isinstance(current_user, Admin):
+        return redirect(url_for('admin_dashboard'))
+    
+    enqueue_job(current_user.id, 'export_csv')
+    flash('Export started. It will be ready to download here shortly.', 'info')
+    return redirect(url_for('jobs'))
+
+@app.route('/jobs/yearly-report', methods=['POST'])
+@login_required
+def job_yearly_report():
+    if isinstance(current_user, Admin):
+        return redirect(url_for('admin_dashboard'))
+    
+    year = request.form.get('year', datetime.now().year, type=int)
+    enqueue_job(current_user.id, 'yearly_report', year=year)
+    flash(f'Report for {year} started. It will be ready to download here shortly.', 'info')
+    return redirect(url_for('jobs'))
+
+@app.route('/jobs/backup', methods=['POST'])
+@login_required
+def job_backup():
+    if isinstance(current_user, Admin):
+        return redirect(url_for('admin_dashboard'))
+    
+    enqueue_job(current_user.id, 'backup')
+    flash('Backup started. It will be ready to download here shortly.', 'info')
+    return redirect(url_for('jobs'))
+
+@app.route('/jobs/restore', methods=['POST'])
+@login_required
+def job_restore():
+    if isinstance(current_user, Admin):
+        return redirect(url_for('admin_dashboard'))
+    
+    upload = request.files.get('backup')
+    if not upload or not upload.filename:
+        flash('Choose a backup file to restore.', 'warning')
+        return redirect(url_for('jobs'))
+    if request.content_length and request.content_length > BACKUP_MAX_UPLOAD:
+        flash('Backup file is too large.', 'danger')
+        return redirect(url_for('jobs'))
+    if upload.stream.read(2) != b'\x1f\x8b':
+        flash('That is not a Monify backup file.', 'danger')
+        return redirect(url_for('jobs'))
+    
+    upload.stream.seek(0)
+    os.makedirs(app.config['JOB_DIR'], exist_ok=True)
+    path = os.path.join(app.config['JOB_DIR'], f'restore_{secrets.token_hex(8)}.ndjson.gz')
+    upload.save(path)
+    enqueue_job(current_user.id, 'restore', result_path=path)
+    flash('Restore started. Your data will appear once the job has finished.', 'info')
+    return redirect(url_for('jobs'))
+
+@app.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    if isinstance(current_user, Admin):
+        return jsonify({'error': 'Not available for admins'}), 403
+    
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<int:job_id>/download')
+@login_required
+def job_download(job_id):
+    if isinstance(current_user, Admin):
+        return redirect(url_for('admin_dashboard'))
+    
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    if job.status != 'done' or not job.result_path or not os.path.exists(job.result_path):
+        abort(404)
+    if not job.result_name:
+        abort(404)
+    mimetype = 'application/gzip' if job.result_name.endswith('.gz') else 'text/csv'
+    return send_file(job.result_path, mimetype=mimetype, as_attachment=True,
+                     download_name=job.result_name)
+
+@app.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def job_cancel(job_id):
+    if isinstance(current_user, Admin):
+        return redirect(url_for('admin_dashboard'))
+    
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    if not job.is_finished():
+        # Conditional updates, because a worker may claim a queued job at any moment
+        cancelled = Job.query.filter_by(id=job.id, status='queued').update(
+            {Job.status: 'cancelled', Job.finished_at: datetime.utcnow()}, synchronize_session=False)
+        if not cancelled:
+            # The worker notices at its next progress update
+            Job.query.filter_by(id=job.id, status='running').update(
+                {Job.cancel_requested: True}, synchronize_session=False)
+        flash('Job cancelled.', 'info')
+    else:
+        remove_job_file(job)
+        db.session.delete(job)
+        flash('Job removed.', 'info')
+    db.session.commit()
+    return redirect(url_for('jobs'))
+
 # Admin Routes
 @app.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
@@ -875,29 +3760,35 @@ def admin_login():
 @app.route('/admin/dashboard')
 @admin_required
 def admin_dashboard():
+    reporting = reporting_session()
+    
     # Get statistics
-    total_users = User.query.count()
-    total_expenses = Expense.query.count()
-    total_categories = Category.query.count()
+    total_users = reporting.query(User).count()
+    total_expenses = sum(fan_out(lambda s: s.query(Expense).count()))
+    total_categories = sum(fan_out(lambda s: s.query(Category).count()))
     total_admins = Admin.query.count()
     
     # Get recent activity
-    recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
-    recent_expenses = Expense.query.order_by(Expense.date.desc()).limit(10).all()
+    recent_users = reporting.query(User).order_by(User.created_at.desc()).limit(5).all()
+    recent_expenses = list(islice(heapq.merge(
+        *fan_out(lambda s: s.query(Expense).order_by(Expense.date.desc()).limit(10).all()),
+        key=lambda expense: expense.date, reverse=True), 10))
     
     # Get monthly stats
     current_month = datetime.now().month
     current_year = datetime.now().year
-    monthly_expenses = db.session.query(func.sum(Expense.amount)).filter(
+    monthly_expenses = sum(fan_out(lambda s: s.query(func.sum(Expense.amount)).filter(
         func.extract('month', Expense.date) == current_month,
         func.extract('year', Expense.date) == current_year
-    ).scalar() or 0
+    ).scalar() or 0))
     
-    # Top categories
-    top_categories = db.session.query(
-        Category.name, 
-        func.sum(Expense.amount).label('total')
-    ).join(Expense).group_by(Category.name).order_by(func.sum(Expense.amount).desc()).limit(5).all()
+    # Top categories (a category name can appear in several shards, so totals are merged first)
+    category_totals = defaultdict(float)
+    for rows in fan_out(lambda s: s.query(Category.name, func.sum(Expense.amount)).join(Expense)
+                        .group_by(Category.name).all()):
+        for name, total in rows:
+            category_totals[name] += total or 0
+    top_categories = sorted(category_totals.items(), key=lambda item: item[1], reverse=True)[:5]
     
     return render_template('admin/dashboard.html',
                          total_users=total_users,
@@ -914,14 +3805,24 @@ def admin_dashboard():
 def admin_users():
     page = request.args.get('page', 1, type=int)
     users = User.query.paginate(page=page, per_page=20, error_out=False)
-    return render_template('admin/users.html', users=users)
+    
+    # Per-user expense counts come from one grouped query per shard
+    user_ids = [user.id for user in users.items]
+    expense_counts = {}
+    for counts in fan_out(lambda s: s.query(
+        Expense.user_id,
+        func.count(Expense.id)
+    ).filter(Expense.user_id.in_(user_ids)).group_by(Expense.user_id).all()):
+        expense_counts.update(counts)
+    return render_template('admin/users.html', users=users, expense_counts=expense_counts)
 
 @app.route('/admin/users/<int:user_id>/delete', methods=['POST'])
 @super_admin_required
 def admin_delete_user(user_id):
     user = User.query.get_or_404(user_id)
-    db.session.delete(user)
-    db.session.commit()
+    with use_shard(shard_for(user.id)):
+        db.session.delete(user)
+        db.session.commit()
     flash(f'User {user.username} deleted successfully!', 'success')
     return redirect(url_for('admin_users'))
 
@@ -957,46 +3858,138 @@ def admin_generate_temp_password(user_id):
 @admin_required
 def admin_expenses():
     page = request.args.get('page', 1, type=int)
-    expenses = Expense.query.order_by(Expense.date.desc()).paginate(page=page, per_page=50, error_out=False)
+    expenses = FanOutPagination(page=page, per_page=50, error_out=False,
+                                query=lambda s: s.query(Expense).order_by(Expense.date.desc()),
+                                key=lambda expense: expense.date)
     return render_template('admin/expenses.html', expenses=expenses)
 
 @app.route('/admin/categories')
 @admin_required
 def admin_categories():
-    categories = Category.query.all()
+    categories = [category for rows in fan_out(lambda s: s.query(Category).all()) for category in rows]
     return render_template('admin/categories.html', categories=categories)
 
 @app.route('/admin/analytics')
 @admin_required
 def admin_analytics():
+    reporting = reporting_session()
+    today = datetime.now()
+    first_month = today.year * 12 + today.month - 12  # the last 12 months by default
+    default_start = '%04d-%02d' % (first_month // 12, first_month % 12 + 1)
+    start = request.args.get('from') or default_start
+    end = request.args.get('to') or today.strftime('%Y-%m')
+    try:
+        start, end = sorted(datetime.strptime(month, '%Y-%m').strftime('%Y-%m') for month in (start, end))
+    except ValueError:
+        flash('Months must be given as YYYY-MM.', 'warning')
+        start, end = default_start, today.strftime('%Y-%m')
+    
     try:
         # Monthly user registrations (SQLite compatible)
-        monthly_users = db.session.query(
+        monthly_users = reporting.query(
             func.strftime('%Y-%m', User.created_at).label('month'),
             func.count(User.id).label('count')
         ).group_by(func.strftime('%Y-%m', User.created_at)).order_by('month').limit(12).all()
         
         # Monthly expense totals (SQLite compatible)
-        monthly_expense_totals = db.session.query(
+        live_totals = select(
             func.strftime('%Y-%m', Expense.date).label('month'),
-            func.sum(Expense.amount).label('total')
-        ).group_by(func.strftime('%Y-%m', Expense.date)).order_by('month').limit(12).all()
+            Expense.amount.label('total')
+        )
+        archived_totals = select(ArchiveRollup.month, ArchiveRollup.total)
+        combined = union_all(live_totals, archived_totals).subquery()
+        month_totals = defaultdict(float)
+        for rows in fan_out(lambda s: s.query(
+            combined.c.month,
+            func.sum(combined.c.total).label('total')
+        ).group_by(combined.c.month).all()):
+            for month, total in rows:
+                month_totals[month] += total or 0
+        monthly_expense_totals = [MonthlyTotal(month, total) for month, total in sorted(month_totals.items())[:12]]
+        
+        # Amount distributions for any month range, merged from the per category name rollups
+        distribution = amount_distribution(start, end)
         
     except Exception as e:
         flash(f'Error loading analytics: {str(e)}', 'danger')
         monthly_users = []
         monthly_expense_totals = []
+        distribution = None
     
     return render_template('admin/analytics.html',
                          monthly_users=monthly_users,
-                         monthly_expense_totals=monthly_expense_totals)
+                         monthly_expense_totals=monthly_expense_totals,
+                         distribution=distribution, start=start, end=end)
+
+@app.route('/admin/forecasts')
+@admin_required
+def admin_forecasts():
+    reporting = reporting_session()
+    forecasts = {}
+    category_names = {}
+    for shard_forecasts, names in fan_out(lambda s: (
+        compute_forecasts(session=s),
+        s.query(Category.user_id, Category.id, Category.name).join(Budget, Budget.category_id == Category.id).all()
+    )):
+        forecasts.update(shard_forecasts)
+        # Category ids are only unique within a shard, so names are keyed by user too
+        category_names.update(((user_id, category_id), name) for user_id, category_id, name in names)
+    
+    # Budgets projected to run over by month end, worst first
+    at_risk = []
+    for user_id, categories in forecasts.items():
+        for category_id, forecast in categories.items():
+            if forecast['limit'] and forecast['projected'] > forecast['limit']:
+                at_risk.append((user_id, category_id, forecast))
+    at_risk.sort(key=lambda item: item[2]['projected_percentage'], reverse=True)
+    at_risk_count = len(at_risk)
+    at_risk = at_risk[:100]
+    
+    usernames = dict(reporting.query(User.id, User.username).filter(
+        User.id.in_({user_id for user_id, _, _ in at_risk})).all())
+    rows = [{
+        'username': usernames.get(user_id),
+        'category': category_names.get((user_id, category_id)),
+        **forecast
+    } for user_id, category_id, forecast in at_risk]
+    
+    totals = {
+        'users': len(forecasts),
+        'budgets': sum(1 for categories in forecasts.values() for f in categories.values() if f['limit']),
+        'at_risk': at_risk_count,
+        'projected': sum(f['projected'] for categories in forecasts.values() for f in categories.values())
+    }
+    return render_template('admin/forecasts.html', rows=rows, totals=totals)
+
+@app.route('/admin/snapshot/refresh', methods=['POST'])
+@admin_required
+def admin_refresh_snapshot():
+    if analytics_snapshot_enabled():
+        refresh_analytics_snapshot()
+        flash('Reporting data refreshed.', 'success')
+    return redirect(request.referrer or url_for('admin_dashboard'))
 
 @app.route('/admin/settings')
 @super_admin_required
 def admin_settings():
     admins = Admin.query.all()
     form = CreateAdminForm()
-    return render_template('admin/settings.html', admins=admins, form=form)
+    retention = {
+        'archive_after_days': app.config['ARCHIVE_AFTER_DAYS'],
+        'archived_expenses': sum(fan_out(lambda s: s.query(ArchivedExpense).count())),
+        'reset_tokens': PasswordResetToken.query.count()
+    }
+    page_cache = dict(page_cache_stats, hit_rate=page_cache_hit_rate(), pages=len(_page_cache),
+                      ttl=app.config['PAGE_CACHE_TTL'])
+    return render_template('admin/settings.html', admins=admins, form=form, retention=retention,
+                           page_cache=page_cache)
+
+@app.route('/admin/retention/run', methods=['POST'])
+@super_admin_required
+def admin_run_retention():
+    archived, purged = run_retention()
+    flash(f'Archived {archived} expenses and purged {purged} reset tokens.', 'success')
+    return redirect(url_for('admin_settings'))
 
 @app.route('/admin/create-admin', methods=['POST'])
 @super_admin_required
@@ -1059,13 +4052,21 @@ def reset_admin():
 def not_found_error(error):
     return render_template('404.html'), 404
 
+@app.errorhandler(CSRFError)
+def csrf_error(error):
+    if request.path.startswith('/api/'):
+        return jsonify({'error': error.description}), 400
+    return error
+
 @app.errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('500.html'), 500
 
+# Existing databases are upgraded before the first request reads them
+with app.app_context():
+    upgrade_database()
+
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+
+# Point the app at a throwaway database before it is imported
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'monify.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as monify
+
+
+@pytest.fixture
+def app():
+    monify.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, PAGE_CACHE_TTL=0)
+    with monify.app.app_context():
+        monify.db.drop_all()
+        monify.db.create_all()
+    yield monify.app
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post('/register', data={'username': 'alice', 'email': 'alice@example.com', 'password': 'secret1',
+                                   'confirm_password': 'secret1', 'agree_terms': 'y'})
+    client.post('/login', data={'email': 'alice@example.com', 'password': 'secret1'})
+    return client
+
+
+@pytest.fixture
+def query_budget():
+    """Wraps track_queries and fails the test when the block runs more than max_queries queries"""
+    @contextmanager
+    def budget(max_queries):
+        with monify.track_queries() as stats:
+            yield stats
+        assert stats.queries <= max_queries, (
+            f'{stats.queries} queries for a budget of {max_queries}; lazy loads: {dict(stats.lazy_loads)}')
+    return budget
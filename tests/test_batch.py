@@ -0,0 +1,17 @@
+from datetime import date
+
+
+def test_batch_requires_csrf_header(app, client):
+    app.config['WTF_CSRF_ENABLED'] = True
+    category_id = client.get('/api/sync').get_json()['changes'][0]['id']
+    payload = {'expenses': [{'description': 'Lunch', 'amount': 12.5, 'date': date.today().isoformat(),
+                             'category_id': category_id}]}
+
+    response = client.post('/api/expenses/batch', json=payload)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+    token = client.get('/api/csrf-token').get_json()['csrf_token']
+    response = client.post('/api/expenses/batch', json=payload, headers={'X-CSRFToken': token})
+    assert response.status_code == 201
+    assert response.get_json()['created'] == 1
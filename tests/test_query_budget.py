@@ -0,0 +1,28 @@
+from datetime import date, timedelta
+
+import pytest
+
+
+def add_expenses(client, category_ids, start, count):
+    rows = [{'description': f'Expense {i}', 'amount': 10 + i % 7, 'date': (date.today() - timedelta(days=i % 28)).isoformat(),
+             'category_id': category_ids[i % len(category_ids)]} for i in range(start, start + count)]
+    assert client.post('/api/expenses/batch', json={'expenses': rows}).status_code == 201
+
+
+@pytest.mark.parametrize('path, max_queries', [
+    ('/home', 1),
+    ('/expenses', 4),
+    ('/expenses?include_archived=1', 5),
+    ('/budgets', 8),
+])
+def test_hot_routes_stay_within_query_budget(client, query_budget, path, max_queries):
+    category_ids = [change['id'] for change in client.get('/api/sync').get_json()['changes']
+                    if change['type'] == 'category']
+    for category_id in category_ids:
+        client.post('/add_budget', data={'category': category_id, 'monthly_limit': 500})
+
+    # The budget holds however many rows and categories the page shows
+    for start, count in ((0, 5), (5, 50)):
+        add_expenses(client, category_ids, start, count)
+        with query_budget(max_queries):
+            assert client.get(path).status_code in (200, 302)
@@ -0,0 +1,71 @@
+from datetime import date
+
+
+def push(client, *mutations):
+    response = client.post('/api/sync', json={'mutations': list(mutations)})
+    assert response.status_code == 200
+    return response.get_json()['results']
+
+
+def pull(client, cursor=None):
+    response = client.get('/api/sync', query_string={'cursor': cursor} if cursor else {})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def pull_all(client, cursor=None):
+    changes = []
+    while True:
+        page = pull(client, cursor)
+        changes += page['changes']
+        cursor = page['cursor']
+        if not page['has_more']:
+            return changes, cursor
+
+
+def test_edit_of_last_synced_object_is_pulled(client):
+    category_id = pull_all(client)[0][0]['id']
+    created = push(client, {'type': 'expense', 'op': 'create', 'data': {
+        'description': 'Coffee', 'amount': 3.5, 'date': date.today().isoformat(), 'category_id': category_id}})[0]
+    assert created['status'] == 'applied'
+    _, cursor = pull_all(client)
+
+    # The expense holds the newest log entry, so rewriting that entry must not reuse its id
+    updated = push(client, {'type': 'expense', 'op': 'update', 'id': created['id'],
+                            'base_updated_at': created['updated_at'], 'data': {'amount': 4.0}})[0]
+    assert updated['status'] == 'applied'
+
+    changes, _ = pull_all(client, cursor)
+    assert [(change['type'], change['id'], change['data']['amount']) for change in changes] == \
+        [('expense', created['id'], 4.0)]
+
+
+def test_delete_of_last_synced_object_is_pulled(client):
+    category_id = pull_all(client)[0][0]['id']
+    created = push(client, {'type': 'expense', 'op': 'create', 'data': {
+        'description': 'Lunch', 'amount': 12, 'date': date.today().isoformat(), 'category_id': category_id}})[0]
+    _, cursor = pull_all(client)
+
+    deleted = push(client, {'type': 'expense', 'op': 'delete', 'id': created['id'],
+                            'base_updated_at': created['updated_at']})[0]
+    assert deleted['status'] == 'applied'
+
+    changes, _ = pull_all(client, cursor)
+    assert [(change['type'], change['id'], change['deleted']) for change in changes] == \
+        [('expense', created['id'], True)]
+
+
+def test_push_requires_csrf_header(app, client):
+    app.config['WTF_CSRF_ENABLED'] = True
+    category_id = pull_all(client)[0][0]['id']
+    mutation = {'type': 'expense', 'op': 'create', 'data': {
+        'description': 'Coffee', 'amount': 3.5, 'date': date.today().isoformat(), 'category_id': category_id}}
+
+    response = client.post('/api/sync', json={'mutations': [mutation]})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+    token = client.get('/api/csrf-token').get_json()['csrf_token']
+    response = client.post('/api/sync', json={'mutations': [mutation]}, headers={'X-CSRFToken': token})
+    assert response.status_code == 200
+    assert response.get_json()['results'][0]['status'] == 'applied'